@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+End-to-end benchmark of GithubCloner against a local mock Github API.
+
+Generates synthetic bare repositories, serves them through MockGithub,
+then enumerates an organization and its members with getReposURLs and
+streams the result into cloneBulkRepos, the way `main` does. Reports API
+calls, wall time, repos/sec and peak RSS.
+
+Usage:
+    ./benchmarks/bench_end_to_end.py --members 50 --repos 20 --latency 0.05
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+import githubcloner  # noqa: E402
+from mock_github import MockGithub, syntheticDataset  # noqa: E402
+
+
+def peakRSS():
+    """
+    Returns the peak resident set size in MB of this process and of its
+    children (the git processes).
+    """
+    scale = 1024.0 ** 2 if sys.platform == "darwin" else 1024.0
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orgs", type=int, default=1,
+                        help="Organizations (Default: 1).")
+    parser.add_argument("--members", type=int, default=20,
+                        help="Members per organization (Default: 20).")
+    parser.add_argument("--repos", type=int, default=10,
+                        help="Repositories per organization and member (Default: 10).")
+    parser.add_argument("--gists", type=int, default=0,
+                        help="Gists per member (Default: 0).")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every API response (Default: 0).")
+    parser.add_argument("--rate-limit", type=int, default=5000,
+                        help="API requests per rate limit window (Default: 5000).")
+    parser.add_argument("--rate-window", type=int, default=3600,
+                        help="Seconds of the rate limit window (Default: 3600).")
+    parser.add_argument("--threads", type=int, default=5,
+                        help="Cloning threads (Default: 5).")
+    parser.add_argument("--enum-threads", type=int, default=4,
+                        help="Member enumeration threads (Default: 4).")
+    parser.add_argument("--clone-engine", default="gitpython",
+                        choices=sorted(githubcloner.CLONE_ENGINES),
+                        help="Clone engine (Default: gitpython).")
+    parser.add_argument("--enumerate-only", action="store_true",
+                        help="Only benchmark the API enumeration.")
+    parser.add_argument("--workdir",
+                        help="Keep the repositories and output in this directory.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="githubcloner-bench-")
+    mock = None
+    try:
+        started = time.time()
+        dataset = syntheticDataset(os.path.join(workdir, "remotes"),
+                                   orgs=args.orgs, members=args.members,
+                                   repos=args.repos, gists=args.gists)
+        setup_time = time.time() - started
+
+        mock = MockGithub(dataset, latency=args.latency,
+                          rate_limit=args.rate_limit, rate_window=args.rate_window)
+        api = githubcloner.getReposURLs(mock.start())
+
+        def enumerate_repos():
+            for org in sorted(dataset.orgs):
+                for repo in api.iterOrgIncludeUsers(org,
+                                                    include_gists=args.gists > 0,
+                                                    threads_limit=args.enum_threads):
+                    yield repo
+
+        started = time.time()
+        repos = githubcloner.uniqueItems(enumerate_repos(), key=lambda repo: repo.URL)
+        if args.enumerate_only:
+            count = sum(1 for _ in repos)
+            failed = 0
+        else:
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                results = githubcloner.cloneBulkRepos(
+                    repos, os.path.join(workdir, "output"),
+                    threads_limit=args.threads,
+                    engine=githubcloner.CLONE_ENGINES[args.clone_engine]())
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            count = len(results)
+            failed = sum(1 for result in results if result.status == "failed")
+        wall_time = time.time() - started
+        rss, children_rss = peakRSS()
+
+        report = {"repositories": count,
+                  "expected_repositories": dataset.repoCount(),
+                  "failed": failed,
+                  "api_requests": mock.requests,
+                  "api_not_modified": mock.not_modified,
+                  "api_rate_limited": mock.rate_limited,
+                  "connections": api.stats.connections,
+                  "setup_seconds": round(setup_time, 3),
+                  "wall_seconds": round(wall_time, 3),
+                  "repos_per_second": round(count / wall_time, 2) if wall_time else None,
+                  "peak_rss_mb": round(rss, 1),
+                  "peak_git_rss_mb": round(children_rss, 1)}
+        if args.json:
+            print(json.dumps(report, indent=1))
+        else:
+            for key in sorted(report):
+                print("{0:>22}: {1}".format(key, report[key]))
+    finally:
+        if mock is not None:
+            mock.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
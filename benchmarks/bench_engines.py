@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# coding=utf-8
+"""
+Compares the clone engines of GithubCloner on local repositories.
+
+Creates a set of local GIT repositories, then clones and updates all of
+them with every engine through cloneBulkRepos, and prints the wall time
+and repositories per second of each run.
+
+Usage:
+    ./benchmarks/bench_engines.py --repos 200 --commits 5 --threads 8
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import githubcloner  # noqa: E402
+
+
+def git(*args):
+    subprocess.check_call(["git"] + list(args),
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def createRepos(path, count, commits):
+    """
+    Creates `count` repositories with `commits` commits each under `path`,
+    and returns their file:// URLs.
+    """
+    URLs = []
+    for i in range(count):
+        repo = os.path.join(path, "owner", "repo{0}".format(i))
+        git("init", "--quiet", repo)
+        for j in range(commits):
+            with open(os.path.join(repo, "file{0}.txt".format(j)), "w") as f:
+                f.write("repo {0} commit {1}\n".format(i, j) * 100)
+            git("-C", repo, "add", "-A")
+            git("-C", repo, "-c", "user.name=bench", "-c", "user.email=bench@localhost",
+                "commit", "--quiet", "-m", "commit {0}".format(j))
+        URLs.append("file://" + repo)
+    return URLs
+
+
+def run(URLs, output, engine, threads):
+    started = time.time()
+    results = githubcloner.cloneBulkRepos(URLs, output, threads_limit=threads,
+                                          engine=engine)
+    elapsed = time.time() - started
+    failed = sum(1 for result in results if result.status == "failed")
+    return elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repos", type=int, default=100,
+                        help="Number of repositories (Default: 100).")
+    parser.add_argument("--commits", type=int, default=5,
+                        help="Commits per repository (Default: 5).")
+    parser.add_argument("--threads", type=int, default=5,
+                        help="Cloning threads (Default: 5).")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="githubcloner-bench-")
+    try:
+        print("[*] Creating {0} repositories...".format(args.repos))
+        URLs = createRepos(os.path.join(workdir, "remotes"), args.repos, args.commits)
+        for name in sorted(githubcloner.CLONE_ENGINES):
+            output = os.path.join(workdir, "output-" + name)
+            imported = time.time()
+            engine = githubcloner.CLONE_ENGINES[name]()
+            imported = time.time() - imported
+            # Keep the benchmark output readable: cloneRepo prints every path.
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                clone_time, clone_failed = run(URLs, output, engine, args.threads)
+                update_time, update_failed = run(URLs, output, engine, args.threads)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            print("{0:>10}: setup {1:.2f}s, clone {2:.2f}s ({3:.1f} repos/s),"
+                  " update {4:.2f}s ({5:.1f} repos/s), {6} failed".format(
+                      name, imported,
+                      clone_time, args.repos / clone_time,
+                      update_time, args.repos / update_time,
+                      clone_failed + update_failed))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
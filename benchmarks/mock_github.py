@@ -0,0 +1,340 @@
+# coding=utf-8
+"""
+A local stand-in for the parts of the Github REST API that GithubCloner
+enumerates, backed by synthetic bare GIT repositories served over
+file:// URLs.
+
+Endpoints: /user, /users/:user/repos, /users/:user/gists, /gists,
+/user/repos, /orgs/:org/repos, /orgs/:org/members, /repos/:owner/:name,
+/repos/:owner/:name/commits/:ref and /repos/:owner/:name/tarball/:ref,
+which redirects to a `git archive` download like codeload does.
+List endpoints paginate with `Link: rel="next"` headers, every response
+carries X-RateLimit-* headers and an ETag, and latency can be injected.
+"""
+
+import hashlib
+import json
+import math
+import os
+import subprocess
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+
+def createBareRepo(path, owner, name):
+    """
+    Creates a bare repository with one commit, using `git fast-import`.
+    """
+    subprocess.check_call(["git", "init", "--quiet", "--bare", path])
+    content = "# {0}/{1}\n".format(owner, name).encode("utf-8")
+    message = "Initial commit of {0}/{1}\n".format(owner, name).encode("utf-8")
+    stream = (b"commit refs/heads/main\n"
+              b"committer Mock <mock@localhost> 1500000000 +0000\n"
+              b"data " + str(len(message)).encode() + b"\n" + message +
+              b"M 644 inline README.md\n"
+              b"data " + str(len(content)).encode() + b"\n" + content + b"\n")
+    process = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=path,
+                               stdin=subprocess.PIPE)
+    process.communicate(stream)
+    subprocess.check_call(["git", "symbolic-ref", "HEAD", "refs/heads/main"], cwd=path)
+
+
+class Dataset(object):
+    """
+    The organizations, users, repositories and gists served by MockGithub.
+    """
+
+    def __init__(self):
+        self.orgs = {}     # org -> list of member logins
+        self.repos = {}    # owner -> list of repository dicts
+        self.gists = {}    # owner -> list of gist dicts
+
+    def addRepo(self, owner, name, URL, size=1, fork=False, source=None):
+        repo = {"name": name,
+                "full_name": "{0}/{1}".format(owner, name),
+                "owner": {"login": owner},
+                "git_url": URL,
+                "fork": fork,
+                "size": size,
+                "pushed_at": "2020-01-01T00:00:00Z",
+                "updated_at": "2020-01-01T00:00:00Z",
+                "default_branch": "main"}
+        if source is not None:
+            repo["source"] = {"full_name": source}
+        self.repos.setdefault(owner, []).append(repo)
+        return repo
+
+    def addGist(self, owner, gist_id, URL):
+        self.gists.setdefault(owner, []).append({
+            "id": gist_id,
+            "owner": {"login": owner},
+            "git_pull_url": URL,
+            "updated_at": "2020-01-01T00:00:00Z"})
+
+    def repoCount(self):
+        return sum(len(repos) for repos in self.repos.values()) + \
+            sum(len(gists) for gists in self.gists.values())
+
+
+def syntheticDataset(remotes, orgs=1, members=10, repos=10, gists=0, forks=0):
+    """
+    Creates bare repositories under `remotes` and the matching Dataset.
+    Input:-
+    remotes: the directory of the bare repositories.
+    Optional Input:-
+    orgs: the number of organizations.
+    members: members per organization.
+    repos: repositories per organization and per member.
+    gists: gists per member.
+    forks: how many of each member's repositories are forks of the
+    organization's repositories.
+    """
+
+    dataset = Dataset()
+
+    def repo(owner, name, **kwargs):
+        path = os.path.join(remotes, owner, name + ".git")
+        createBareRepo(path, owner, name)
+        return dataset.addRepo(owner, name, "file://" + path, **kwargs)
+
+    for o in range(orgs):
+        org = "org{0}".format(o)
+        dataset.orgs[org] = []
+        for r in range(repos):
+            repo(org, "repo{0}".format(r), size=r + 1)
+        for m in range(members):
+            member = "{0}-member{1}".format(org, m)
+            dataset.orgs[org].append(member)
+            for r in range(repos):
+                if r < forks:
+                    repo(member, "repo{0}".format(r), size=r + 1, fork=True,
+                         source="{0}/repo{1}".format(org, r))
+                else:
+                    repo(member, "own{0}".format(r), size=r + 1)
+            for g in range(gists):
+                gist_id = hashlib.sha1("{0}/{1}".format(member, g).encode()).hexdigest()[:20]
+                path = os.path.join(remotes, "gists", gist_id + ".git")
+                createBareRepo(path, member, gist_id)
+                dataset.addGist(member, gist_id, "file://" + path)
+    return dataset
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockGithub(object):
+    """
+    Serves a Dataset as a paginated, rate-limited Github API.
+    """
+
+    def __init__(self, dataset, latency=0.0, rate_limit=5000, rate_window=3600,
+                 max_per_page=100):
+        """
+        Input:-
+        dataset: a Dataset instance.
+        Optional Input:-
+        latency: seconds added to every response.
+        rate_limit: requests allowed per window, per client.
+        rate_window: seconds until the rate limit resets.
+        max_per_page: the page size cap, like the real API's 100.
+        """
+        self.dataset = dataset
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.max_per_page = max_per_page
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.rate_limited = 0
+        self.budgets = {}
+        self.server = None
+
+    def start(self, port=0):
+        """
+        Starts serving in a background thread and returns the API prefix.
+        """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mock.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return "http://127.0.0.1:{0}".format(self.server.server_address[1])
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def budget(self, client):
+        """
+        Spends one request of a client's budget.
+        Output:-
+        a (limit, remaining, reset) tuple; remaining is -1 when exhausted.
+        """
+        now = time.time()
+        with self.lock:
+            self.requests += 1
+            remaining, reset = self.budgets.get(client, (self.rate_limit, now + self.rate_window))
+            if reset <= now:
+                remaining, reset = self.rate_limit, now + self.rate_window
+            remaining -= 1
+            self.budgets[client] = (max(remaining, 0), reset)
+            if remaining < 0:
+                self.rate_limited += 1
+            return self.rate_limit, remaining, int(math.ceil(reset))
+
+    def items(self, path):
+        """
+        Returns the list served at `path`, or None if there is none.
+        """
+        parts = path.strip("/").split("/")
+        dataset = self.dataset
+        if parts == ["gists"] or parts == ["user", "repos"]:
+            # The authenticated user is the first member of the first org.
+            logins = [login for members in dataset.orgs.values() for login in members]
+            login = logins[0] if logins else None
+            source = dataset.gists if parts == ["gists"] else dataset.repos
+            return source.get(login, [])
+        if len(parts) == 3 and parts[0] == "users":
+            if parts[2] == "repos":
+                return dataset.repos.get(parts[1], [])
+            if parts[2] == "gists":
+                return dataset.gists.get(parts[1], [])
+        if len(parts) == 3 and parts[0] == "orgs" and parts[1] in dataset.orgs:
+            if parts[2] == "repos":
+                return dataset.repos.get(parts[1], [])
+            if parts[2] == "members":
+                return [{"login": login} for login in dataset.orgs[parts[1]]]
+        return None
+
+    def handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        client = request.headers.get("Authorization") or request.client_address[0]
+        limit, remaining, reset = self.budget(client)
+        headers = {"X-RateLimit-Limit": str(limit),
+                   "X-RateLimit-Remaining": str(max(remaining, 0)),
+                   "X-RateLimit-Reset": str(reset)}
+        if remaining < 0:
+            return self.send(request, 403, {"message": "API rate limit exceeded"}, headers)
+
+        URL = urlparse(request.path)
+        query = parse_qs(URL.query)
+        parts = URL.path.strip("/").split("/")
+        if parts == ["user"]:
+            return self.send(request, 200, {"login": "mock"}, headers)
+        if parts[0] == "codeload" and len(parts) == 4:
+            return self.codeload(request, parts[1], parts[2], parts[3], headers)
+        if len(parts) >= 3 and parts[0] == "repos":
+            repo = self.repo(parts[1], parts[2])
+            if repo is None:
+                return self.send(request, 404, {"message": "Not Found"}, headers)
+            if len(parts) == 3:
+                return self.send(request, 200, repo, headers)
+            if len(parts) >= 5 and parts[3] in ("commits", "tarball"):
+                sha = self.revParse(repo, "/".join(parts[4:]))
+                if sha is None:
+                    return self.send(request, 404, {"message": "No commit found"}, headers)
+                if parts[3] == "tarball":
+                    headers["Location"] = "http://{0}/codeload/{1}/{2}/{3}".format(
+                        request.headers["Host"], parts[1], parts[2], sha)
+                    return self.send(request, 302, b"", headers)
+                if request.headers.get("Accept") == "application/vnd.github.sha":
+                    return self.send(request, 200, sha.encode("ascii"), headers)
+                return self.send(request, 200, {"sha": sha}, headers)
+            return self.send(request, 404, {"message": "Not Found"}, headers)
+
+        items = self.items(URL.path)
+        if items is None:
+            return self.send(request, 404, {"message": "Not Found"}, headers)
+        per_page = min(int(query.get("per_page", ["30"])[0]), self.max_per_page)
+        page = int(query.get("page", ["1"])[0])
+        # Like Github, every page of a listing of several pages has a
+        # Link header; the last one only links back.
+        links = []
+        if page * per_page < len(items):
+            links.append((page + 1, "next"))
+            links.append((int(math.ceil(len(items) / float(per_page))), "last"))
+        if page > 1:
+            links.append((1, "first"))
+            links.append((page - 1, "prev"))
+        if links:
+            headers["Link"] = ", ".join(
+                '<http://{0}{1}?per_page={2}&page={3}>; rel="{4}"'.format(
+                    request.headers["Host"], URL.path, per_page, number, rel)
+                for number, rel in links)
+        return self.send(request, 200, items[(page - 1) * per_page:page * per_page], headers)
+
+    def repo(self, owner, name):
+        for repo in self.dataset.repos.get(owner, []):
+            if repo["name"] == name:
+                return repo
+        return None
+
+    def revParse(self, repo, ref):
+        """
+        Returns the commit SHA of a ref of a repository, or None.
+        """
+        process = subprocess.Popen(["git", "rev-parse", "--verify", "--quiet",
+                                    ref + "^{commit}"],
+                                   cwd=repo["git_url"][len("file://"):],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout = process.communicate()[0]
+        return stdout.decode("ascii").strip() if process.returncode == 0 else None
+
+    def codeload(self, request, owner, name, sha, headers):
+        """
+        Serves a gzipped tarball of a commit, as codeload.github.com does.
+        """
+        repo = self.repo(owner, name)
+        if repo is None:
+            return self.send(request, 404, {"message": "Not Found"}, headers)
+        process = subprocess.Popen(["git", "archive", "--format=tar.gz",
+                                    "--prefix={0}-{1}-{2}/".format(owner, name, sha[:7]),
+                                    sha],
+                                   cwd=repo["git_url"][len("file://"):],
+                                   stdout=subprocess.PIPE)
+        data = process.communicate()[0]
+        headers["Content-Type"] = "application/x-gzip"
+        return self.send(request, 200, data, headers)
+
+    def send(self, request, status, body, headers):
+        if isinstance(body, bytes):
+            data = body
+        else:
+            data = json.dumps(body).encode("utf-8")
+        etag = '"{0}"'.format(hashlib.sha1(data).hexdigest())
+        if status == 200 and request.headers.get("If-None-Match") == etag:
+            with self.lock:
+                self.not_modified += 1
+            status, data = 304, b""
+        request.send_response(status)
+        if "Content-Type" not in headers:
+            request.send_header("Content-Type", "application/json; charset=utf-8")
+        request.send_header("Content-Length", str(len(data)))
+        request.send_header("ETag", etag)
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
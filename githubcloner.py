@@ -14,415 +14,4018 @@
 # *******************************************************************
 
 # Modules
+import atexit
+import errno
+import fnmatch
+import hashlib
 import json
 import os
+import random
+import re
 try:
     import queue
 except ImportError:
     import Queue as queue
+import shutil
+import socket
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+import subprocess
+import sys
+import tarfile
 import threading
 import time
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
 
 import argparse
-import git
 import requests
+from requests.adapters import HTTPAdapter
 from sys import exit
+from urllib3.util.retry import Retry
 
 
-class getReposURLs:
-    def __init__(self, api_prefix, exclude_repos=None):
-        self.user_agent = "GithubCloner (https://github.com/mazen160/GithubCloner)"
-        self.headers = {'User-Agent': self.user_agent, 'Accept': '*/*'}
-        self.timeout = 30
-        self.api_prefix = api_prefix
-        self.excluded_repos_list = [] if exclude_repos is None else\
-            exclude_repos.strip().split(',')
+class ConnectionStats(object):
+    """
+    Thread-safe counters of HTTP connections opened and requests made.
+    """
 
-    def filter_excluded_repos(self, url):
-        '''
-        True only if the url doesn't contain any string from
-        `self.excluded_repos_list`
-        '''
-        return not any((excluded_repo in url
-                        for excluded_repo in self.excluded_repos_list))
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
 
-    def append_response(self, URLs, resp, key, exclude_forked=False):
-        '''Append the urls from response from a given criteria'''
-        for i, _ in enumerate(resp):
-            if exclude_forked and resp[i]['fork']:
-                continue
-            resp_i_key = resp[i][key]
-            if self.filter_excluded_repos(resp_i_key):
-                URLs.append(resp_i_key)
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
 
-    def UserGists(self, user, username=None, token=None):
+    def request_made(self):
+        with self.lock:
+            self.requests += 1
+
+    def __str__(self):
+        return "{0} requests over {1} connections".format(
+            self.requests, self.connections)
+
+
+def countingPool(pool_cls, stats):
+    """
+    Returns a subclass of a urllib3 connection pool that counts
+    every new connection into `stats`.
+    """
+
+    class CountingPool(pool_cls):
+        def _new_conn(self):
+            stats.connection_opened()
+            return pool_cls._new_conn(self)
+
+    return CountingPool
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that records connections opened and requests made.
+    """
+
+    def __init__(self, stats, *args, **kwargs):
+        self.stats = stats
+        super(CountingHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(CountingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(
+            (scheme, countingPool(pool_cls, self.stats))
+            for scheme, pool_cls in
+            self.poolmanager.pool_classes_by_scheme.items())
+
+    def send(self, request, **kwargs):
+        self.stats.request_made()
+        return super(CountingHTTPAdapter, self).send(request, **kwargs)
+
+
+def createSession(stats, pool_size=10, max_retries=3, keep_alive=True):
+    """
+    Creates a connection-pooled requests session.
+    Input:-
+    stats: a ConnectionStats instance.
+    Optional Input:-
+    pool_size: number of connections kept alive per host.
+    max_retries: HTTP-level retries on connection errors and 5xx responses.
+    keep_alive: reuse connections between requests.
+    Output:-
+    a requests.Session instance.
+    """
+
+    retry = Retry(total=max_retries,
+                  backoff_factor=0.5,
+                  status_forcelist=(500, 502, 503, 504),
+                  raise_on_status=False)
+    adapter = CountingHTTPAdapter(stats,
+                                  pool_connections=pool_size,
+                                  pool_maxsize=pool_size,
+                                  max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+TRANSIENT_ERRORS = ("early eof", "connection reset", "connection refused",
+                    "connection timed out", "operation timed out", "timed out",
+                    "could not resolve host", "rpc failed", "remote end hung up",
+                    "unexpected disconnect", "the requested url returned error: 5",
+                    "error: 429", "temporary failure", "broken pipe",
+                    "gnutls recv error", "ssl_read", "internal server error",
+                    "connection broken", "unexpected end of data",
+                    "bad gateway", "service unavailable", "gateway timeout")
+AUTH_ERRORS = ("authentication failed", "could not read username",
+               "could not read password", "permission denied",
+               "the requested url returned error: 401",
+               "the requested url returned error: 403", "bad credentials")
+NOT_FOUND_ERRORS = ("not found", "does not appear to be a git repository",
+                    "does not exist", "the requested url returned error: 404")
+
+
+def classifyStatus(status_code):
+    """
+    Classifies an HTTP status code as "transient", "auth", "not-found",
+    "fatal", or None for success.
+    """
+    if status_code < 400:
+        return None
+    if status_code >= 500 or status_code == 429:
+        return "transient"
+    if status_code in (401, 403):
+        return "auth"
+    if status_code in (404, 410):
+        return "not-found"
+    return "fatal"
+
+
+def classifyError(error):
+    """
+    Classifies an exception raised by an API request or a git command.
+    Output:-
+    "transient": worth retrying, e.g. a reset connection or a 502.
+    "auth": invalid or insufficient credentials.
+    "not-found": the repository or account does not exist.
+    "fatal": anything else.
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError,
+                          requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError)):
+        return "transient"
+    response = getattr(error, "response", None)
+    if response is not None:
+        return classifyStatus(response.status_code) or "fatal"
+    message = str(error).lower()
+    if any(pattern in message for pattern in AUTH_ERRORS):
+        return "auth"
+    if any(pattern in message for pattern in NOT_FOUND_ERRORS):
+        return "not-found"
+    if any(pattern in message for pattern in TRANSIENT_ERRORS):
+        return "transient"
+    return "fatal"
+
+
+class RetryPolicy(object):
+    """
+    Retries of transient failures, with jittered exponential backoff.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=60.0):
         """
-        Returns a list of GIT URLs for accessible gists.
-        Input:-
-        user: Github user.
         Optional Input:-
-        username: Github username.
-        token: Github token or password.
-        Output:-
-        a list of Github gist repositories URLs.
+        max_attempts: the cap on attempts, the first one included.
+        base_delay: the backoff of the first retry, in seconds.
+        max_delay: the cap on a single backoff, in seconds.
         """
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
 
-        URLs = []
-        resp = []
-        current_page = 1
-        while (len(resp) != 0 or current_page == 1):
-            API = "{0}/users/{1}/gists?page={2}".format(
-                self.api_prefix, user, current_page)
-            if (username or token) is None:
-                resp = requests.get(API, headers=self.headers,
-                                    timeout=self.timeout).text
-            else:
-                resp = requests.get(
-                    API, headers=self.headers,
-                    timeout=self.timeout,
-                    auth=(username, token)).text
-            resp = json.loads(resp)
+    def delay(self, attempt):
+        """
+        Returns the "full jitter" backoff before retry number `attempt`.
+        """
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * 2 ** (attempt - 1)))
 
-            if self.checkResponse(resp) != 0:
-                return []
+    def retry(self, error_class, attempt):
+        """
+        True if a failure of `error_class` on attempt number `attempt`
+        should be retried, after sleeping the backoff.
+        """
+        if error_class != "transient" or attempt >= self.max_attempts:
+            return False
+        time.sleep(self.delay(attempt))
+        return True
 
-            self.append_response(URLs, resp, "git_pull_url")
-            current_page += 1
-        return URLs
 
-    def AuthenticatedGists(self, username, token):
+class FailureReport(object):
+    """
+    The failures of a run, written as JSON at its end so that a follow-up
+    run can retry only what failed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+
+    def add(self, kind, URL, error_class, error, attempts=1, **extra):
         """
-        Returns a list of gists of an authenticated user.
+        Records a failure.
         Input:-
-        username: Github username.
-        token: Github token or password.
-        Output:-
-        a list of Github gist repositories URLs.
+        kind: "api" or "clone".
+        URL: the API or GIT URL that failed.
+        error_class: the classifyError class of the failure.
+        error: the error message.
+        Optional Input:-
+        attempts: the number of attempts made.
+        extra: data needed to retry, e.g. the repository metadata.
         """
+        entry = {"kind": kind, "URL": URL, "class": error_class,
+                 "error": error, "attempts": attempts}
+        entry.update(extra)
+        with self.lock:
+            self.entries.append(entry)
 
-        URLs = []
-        resp = []
-        current_page = 1
-        while (len(resp) != 0 or current_page == 1):
-            API = "{0}/gists?page={1}".format(self.api_prefix, current_page)
-            resp = requests.get(API,
-                                headers=self.headers,
-                                timeout=self.timeout,
-                                auth=(username, token)).text
-            resp = json.loads(resp)
-            self.append_response(URLs, resp, "git_pull_url")
-            current_page += 1
+    def save(self, path):
+        """
+        Writes the report to disk.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self.lock:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.entries, f, indent=1)
+            os.rename(path + ".tmp", path)
+
+    @staticmethod
+    def load(path):
+        """
+        Reads a report written by `save`.
+        """
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return []
 
-        return URLs
 
-    def fromUser(self, user, username=None, token=None, include_gists=False, exclude_forked=False):
+class Metrics(object):
+    """
+    Timings and counters of a run: the latency of every API request, the
+    duration and bytes of every clone, the duration of the git phases
+    (transfer, delta resolution, checkout), queue depth and worker
+    utilization. Every measurement is appended to an optional JSON-lines
+    event log; the totals can be written as a Prometheus textfile.
+    """
+
+    def __init__(self, log_path=None, textfile_path=None):
         """
-        Retrieves a list of repositories for a Github user.
-        Input:-
-        user: Github username.
         Optional Input:-
-        username: Github username.
-        token: Github token or password.
-        Output:-
-        a list of Github repositories URLs.
+        log_path: the JSON-lines event log, appended to.
+        textfile_path: the Prometheus textfile written by `close`.
         """
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.log = open(log_path, "a", 1) if log_path else None
+        self.textfile_path = textfile_path
+        self.api_requests = {}
+        self.api_seconds = 0.0
+        self.repositories = {}
+        self.clone_seconds = {}
+        self.clone_bytes = 0
+        self.phase_seconds = {}
+        self.phases = {}
+        self.queue_depth = 0
+        self.busy_workers = 0
+        self.workers = 0
+        self.busy_seconds = 0.0
+        self.worker_seconds = 0.0
+        self.closed = False
 
-        URLs = []
-        resp = []
-        current_page = 1
-        while (len(resp) != 0 or current_page == 1):
-            API = "{0}/users/{1}/repos?per_page=40000000&page={2}".format(
-                self.api_prefix, user, current_page)
+    def event(self, kind, **fields):
+        """
+        Appends an event to the event log.
+        """
+        if self.log is None:
+            return
+        fields["event"] = kind
+        fields["time"] = round(time.time(), 3)
+        line = json.dumps(fields, sort_keys=True)
+        with self.lock:
+            if not self.log.closed:
+                self.log.write(line + "\n")
 
-            if (username or token) is None:
-                resp = requests.get(API, headers=self.headers,
-                                    timeout=self.timeout).text
-            else:
-                resp = requests.get(
-                    API,
-                    headers=self.headers,
-                    timeout=self.timeout,
-                    auth=(username, token)).text
-            resp = json.loads(resp)
+    def apiRequest(self, method, URL, status, seconds):
+        """
+        Records an API request; `status` is None for connection errors.
+        """
+        with self.lock:
+            key = str(status or "error")
+            self.api_requests[key] = self.api_requests.get(key, 0) + 1
+            self.api_seconds += seconds
+        self.event("api", method=method, URL=URL, status=status,
+                   seconds=round(seconds, 4))
 
-            if self.checkResponse(resp) != 0:
-                return []
+    def clone(self, result):
+        """
+        Records a CloneResult.
+        """
+        with self.lock:
+            status = result.status
+            self.repositories[status] = self.repositories.get(status, 0) + 1
+            self.clone_seconds[status] = self.clone_seconds.get(status, 0.0) + result.duration
+            self.clone_bytes += result.bytes
+        self.event("clone", URL=result.URL, path=result.path, status=result.status,
+                   seconds=round(result.duration, 3), bytes=result.bytes,
+                   attempts=result.attempts, error_class=result.error_class)
 
-            self.append_response(URLs, resp, "git_url", exclude_forked)
+    def progress(self, path, progress):
+        """
+        The progress callable of GitCLIEngine: times every git phase of
+        a repository from its first progress line to 100%.
+        """
+        key = (path, progress["phase"])
+        now = time.time()
+        with self.lock:
+            started = self.phases.setdefault(key, now)
+            if progress["percent"] < 100:
+                return
+            del self.phases[key]
+            seconds = now - started
+            self.phase_seconds[progress["phase"]] = \
+                self.phase_seconds.get(progress["phase"], 0.0) + seconds
+        self.event("phase", path=path[:-len(TMP_SUFFIX)] if path.endswith(TMP_SUFFIX) else path,
+                   phase=progress["phase"], seconds=round(seconds, 3),
+                   objects=progress["total"], bytes=progress["bytes"])
 
-            if include_gists is True:
-                URLs.extend(self.UserGists(
-                    user, username=username, token=token))
-            current_page += 1
-        return URLs
+    def pool(self, queue_depth, busy_workers, workers, job_seconds):
+        """
+        Records the state of the worker pool after a finished job.
+        """
+        with self.lock:
+            self.queue_depth = queue_depth
+            self.busy_workers = busy_workers
+            self.workers = workers
+            self.busy_seconds += job_seconds
+        self.event("pool", queue_depth=queue_depth, busy_workers=busy_workers,
+                   workers=workers)
 
-    def fromOrg(self, org_name, username=None, token=None, exclude_forked=False):
+    def workerExited(self, seconds):
         """
-        Retrieves a list of repositories for a Github organization.
+        Records the lifetime of a worker thread.
+        """
+        with self.lock:
+            self.worker_seconds += seconds
+
+    def utilization(self):
+        """
+        Returns the fraction of the worker threads' lifetime spent on jobs.
+        """
+        if not self.worker_seconds:
+            return 0.0
+        return min(self.busy_seconds / self.worker_seconds, 1.0)
+
+    def prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def metric(name, kind, help, samples):
+            lines.append("# HELP githubcloner_{0} {1}".format(name, help))
+            lines.append("# TYPE githubcloner_{0} {1}".format(name, kind))
+            for labels, value in samples:
+                labels = ",".join('{0}="{1}"'.format(key, labels[key])
+                                  for key in sorted(labels))
+                lines.append("githubcloner_{0}{1} {2}".format(
+                    name, "{" + labels + "}" if labels else "", value))
+
+        with self.lock:
+            metric("api_requests_total", "counter", "API requests by HTTP status.",
+                   [({"status": status}, count)
+                    for status, count in sorted(self.api_requests.items())])
+            metric("api_request_seconds_total", "counter",
+                   "Time spent waiting for API responses.",
+                   [({}, round(self.api_seconds, 3))])
+            metric("repositories_total", "counter", "Repositories by outcome.",
+                   [({"status": status}, count)
+                    for status, count in sorted(self.repositories.items())])
+            metric("clone_seconds_total", "counter",
+                   "Time spent cloning and updating repositories, by outcome.",
+                   [({"status": status}, round(seconds, 3))
+                    for status, seconds in sorted(self.clone_seconds.items())])
+            metric("clone_bytes_total", "counter", "Bytes fetched.",
+                   [({}, self.clone_bytes)])
+            metric("git_phase_seconds_total", "counter",
+                   "Time spent in git phases, with the git clone engine.",
+                   [({"phase": phase}, round(seconds, 3))
+                    for phase, seconds in sorted(self.phase_seconds.items())])
+            metric("queue_depth", "gauge", "Repositories queued for the workers.",
+                   [({}, self.queue_depth)])
+            metric("workers", "gauge", "Worker threads.", [({}, self.workers)])
+            metric("worker_utilization", "gauge",
+                   "Fraction of the worker threads' time spent on jobs.",
+                   [({}, round(self.utilization(), 4))])
+            metric("run_seconds", "gauge", "Duration of the run.",
+                   [({}, round(time.time() - self.started, 3))])
+            metric("last_run_timestamp_seconds", "gauge", "End of the run.",
+                   [({}, int(time.time()))])
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """
+        Writes the Prometheus textfile and closes the event log.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.textfile_path:
+            # Written aside and renamed, so a collector never reads half a file.
+            with open(self.textfile_path + ".tmp", "w") as f:
+                f.write(self.prometheus())
+            os.rename(self.textfile_path + ".tmp", self.textfile_path)
+        if self.log is not None:
+            self.event("summary", seconds=round(time.time() - self.started, 3),
+                       api_requests=sum(self.api_requests.values()),
+                       repositories=self.repositories,
+                       bytes=self.clone_bytes,
+                       worker_utilization=round(self.utilization(), 4))
+            with self.lock:
+                self.log.close()
+
+
+class SamplingProfiler(object):
+    """
+    A wall-clock sampling profiler: a background thread records the stack
+    of every other thread with sys._current_frames() at a fixed interval.
+    Waiting shows up as much as computing, which is what tells API paging,
+    git transfers and disk apart.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.thread.ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{0} ({1}:{2})".format(
+                    code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def dump(self, path, top=15):
+        """
+        Stops sampling, writes the collapsed stacks ("frame;frame count"
+        lines, the input of flame graph tools) to `path` and prints the
+        functions seen in most samples.
+        """
+        self.stop()
+        stacks = sorted(self.stacks.items(), key=lambda item: -item[1])
+        with open(path, "w") as f:
+            for stack, count in stacks:
+                f.write("{0} {1}\n".format(stack, count))
+
+        inclusive = {}
+        own = {}
+        for stack, count in stacks:
+            frames = stack.split(";")
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for name in set(frames):
+                inclusive[name] = inclusive.get(name, 0) + count
+        total = float(sum(self.stacks.values())) or 1.0
+        print("[*] Profile: {0} samples written to {1}".format(self.samples, path))
+        print("[*] {0:>7} {1:>7}  {2}".format("total", "self", "function"))
+        for name, count in sorted(inclusive.items(), key=lambda item: -item[1])[:top]:
+            print("[*] {0:>6.1%} {1:>6.1%}  {2}".format(
+                count / total, own.get(name, 0) / total, name))
+
+
+class RateLimitScheduler(object):
+    """
+    Paces API requests to stay within the Github rate limit budget and
+    rotates between several credentials.
+    """
+
+    def __init__(self, credentials=None, reserve=0.1):
+        """
+        Optional Input:-
+        credentials: a list of (username, token) tuples to rotate between.
+        reserve: fraction of the budget below which requests are spread
+        evenly until the limit resets.
+        """
+        self.lock = threading.Lock()
+        self.credentials = list(credentials or [])
+        self.reserve = reserve
+        self.state = {}
+        self.index = 0
+
+    def _state(self, credential, resource):
+        return self.state.setdefault((credential, resource), {"limit": None,
+                                                  "remaining": None,
+                                                  "reset": 0.0,
+                                                  "not_before": 0.0})
+
+    def _interval(self, state, now):
+        """
+        Returns the delay to keep between requests of a credential.
+        """
+        if state["limit"] is None or state["remaining"] is None:
+            return 0
+        if state["reset"] <= now or state["remaining"] >= state["limit"] * self.reserve:
+            return 0
+        return (state["reset"] - now) / max(state["remaining"], 1)
+
+    def choose(self, key, username=None, token=None, rotate=True, resource="core"):
+        """
+        Picks the credential of a sequence of requests that must all be
+        sent as the same user, e.g. the pages of one listing.
+        The same `key` gets the same credential run after run, so its
+        cached pages stay valid, unless that credential is out of budget.
         Input:-
-        org_name: Github organization name.
+        key: the sequence, e.g. the URL of the listing.
+        username: Github username requested by the caller.
+        token: Github token or password requested by the caller.
         Optional Input:-
-        username: Github username.
-        token: Github token or password.
+        rotate: pick from the configured credentials instead.
+        resource: the rate limit budget of the requests ("core", "graphql").
         Output:-
-        a list of Github repositories URLs.
+        the (username, token) tuple to send every request of the sequence with.
         """
 
-        URLs = []
-        resp = []
-        current_page = 1
-        while (len(resp) != 0 or current_page == 1):
-            API = "{0}/orgs/{1}/repos?per_page=40000000&page={2}".format(
-                self.api_prefix, org_name, current_page)
-            if (username or token) is None:
-                resp = requests.get(API, headers=self.headers,
-                                    timeout=self.timeout).text
-            else:
-                resp = requests.get(
-                    API,
-                    headers=self.headers,
-                    timeout=self.timeout,
-                    auth=(username, token)).text
-            resp = json.loads(resp)
+        if not (rotate and self.credentials):
+            return (username, token)
+        start = int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % len(self.credentials)
+        candidates = self.credentials[start:] + self.credentials[:start]
+        now = time.time()
+        with self.lock:
+            for credential in candidates:
+                state = self._state(credential, resource)
+                if not (state["remaining"] == 0 and state["reset"] > now):
+                    return credential
+            return min(candidates, key=lambda credential: self._state(credential, resource)["reset"])
 
-            if self.checkResponse(resp) != 0:
-                return []
+    def acquire(self, username=None, token=None, rotate=True, resource="core"):
+        """
+        Blocks until a request may be sent.
+        Input:-
+        username: Github username requested by the caller.
+        token: Github token or password requested by the caller.
+        Optional Input:-
+        rotate: pick from the configured credentials instead.
+        resource: the rate limit budget of the request ("core", "graphql").
+        Output:-
+        the (username, token) tuple to send the request with.
+        """
 
-            self.append_response(URLs, resp, "git_url", exclude_forked)
-            current_page += 1
-        return URLs
+        candidates = [(username, token)]
+        if rotate and self.credentials:
+            candidates = self.credentials
+        while True:
+            with self.lock:
+                now = time.time()
+                ready_at = None
+                for i in range(len(candidates)):
+                    credential = candidates[(self.index + i) % len(candidates)]
+                    state = self._state(credential, resource)
+                    if state["remaining"] == 0 and state["reset"] > now:
+                        available = state["reset"]
+                    else:
+                        available = state["not_before"]
+                    if available <= now:
+                        self.index = (self.index + i + 1) % len(candidates)
+                        state["not_before"] = now + self._interval(state, now)
+                        if state["remaining"]:
+                            state["remaining"] -= 1
+                        return credential
+                    ready_at = available if ready_at is None else min(ready_at, available)
+                wait = ready_at - now
+            if wait > 5:
+                print("[*] Github API rate limit reached, waiting {0} seconds.".format(int(wait)))
+            time.sleep(max(wait, 0.05))
 
-    def fromOrgIncludeUsers(self,
-                            org_name,
-                            username=None,
-                            token=None,
-                            include_gists=False,
-                            exclude_forked=False):
+    def update(self, credential, response, resource="core"):
         """
-        Retrieves a list of repositories for a Github organization
-        and repositories of the Github organization's members.
+        Records the rate limit headers of a response.
         Input:-
-        org_name: Github organization name.
+        credential: the (username, token) tuple used for the request.
+        response: a requests.Response instance.
         Optional Input:-
-        username: Github username.
-        token: Github token or password.
+        resource: the rate limit budget of the request ("core", "graphql").
         Output:-
-        a list of Github repositories URLs.
+        True: if the request was rate limited and should be sent again.
+        False: otherwise.
+        """
+
+        headers = response.headers
+        now = time.time()
+        with self.lock:
+            state = self._state(credential, resource)
+            if "X-RateLimit-Limit" in headers:
+                state["limit"] = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers:
+                state["remaining"] = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset" in headers:
+                state["reset"] = float(headers["X-RateLimit-Reset"])
+
+            if response.status_code not in (403, 429):
+                return False
+            if "Retry-After" in headers:
+                state["not_before"] = now + float(headers["Retry-After"])
+                return True
+            if state["remaining"] == 0 and state["reset"] > now:
+                return True
+            if "rate limit" in response.text:
+                # Secondary rate limits without a Retry-After header.
+                state["not_before"] = now + 60
+                return True
+        return False
+
+
+class ResponseCache(object):
+    """
+    On-disk cache of API list pages, revalidated with conditional requests
+    (ETag / Last-Modified) and evicted least-recently-used first.
+    """
+
+    def __init__(self, path, max_size=100 * 1024 * 1024):
+        """
+        Input:-
+        path: the cache directory.
+        Optional Input:-
+        max_size: the cache size cap in bytes.
+        """
+        self.lock = threading.Lock()
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        # Entries hold authenticated responses, e.g. private repositories.
+        if not os.path.exists(path):
+            os.makedirs(path, 0o700)
+        try:
+            os.chmod(path, 0o700)
+        except OSError:
+            pass
+        self.size = sum(os.path.getsize(os.path.join(path, name))
+                        for name in os.listdir(path))
+
+    def _filename(self, URL, username=None):
+        key = "{0}\n{1}".format(username or "", URL).encode("utf-8")
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest() + ".json")
+
+    def lookup(self, URL, username=None):
+        """
+        Returns the cached entry of a URL, or None.
+        """
+        filename = self._filename(URL, username)
+        try:
+            with open(filename) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            os.utime(filename, None)
+        except OSError:
+            pass
+        return entry
+
+    def validators(self, entry):
+        """
+        Returns the conditional request headers of a cached entry.
+        """
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, URL, response, username=None):
+        """
+        Caches a response if it carries validators.
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            return
+        data = json.dumps({"url": URL,
+                           "etag": etag,
+                           "last_modified": last_modified,
+                           "link": response.headers.get("Link"),
+                           "body": response.text})
+        filename = self._filename(URL, username)
+        tmp = "{0}.{1}.tmp".format(filename, threading.current_thread().ident)
+        with self.lock:
+            old_size = os.path.getsize(filename) if os.path.exists(filename) else 0
+            with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+                           "w") as f:
+                f.write(data)
+            os.rename(tmp, filename)
+            self.size += os.path.getsize(filename) - old_size
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """
+        Removes least recently used entries until the cache fits its cap.
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            filename = os.path.join(self.path, name)
+            try:
+                entries.append((os.path.getmtime(filename),
+                                os.path.getsize(filename), filename))
+            except OSError:
+                continue
+        entries.sort()
+        for _, size, filename in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+                self.size -= size
+            except OSError:
+                pass
+
+    def revive(self, entry, response):
+        """
+        Turns a 304 Not Modified response into the cached page.
+        """
+        with self.lock:
+            self.hits += 1
+        response.status_code = 200
+        response._content = entry["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        if entry.get("link"):
+            response.headers["Link"] = entry["link"]
+        return response
+
+
+def defaultCachePath():
+    """
+    Returns the default directory of the API response cache.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "githubcloner")
+
+
+def orderedThreadMap(function, items, threads_limit):
+    """
+    Applies `function` to every item using a bounded pool of threads.
+    Results are yielded in the order of `items`, each one as soon as it
+    and every result before it are ready. At most `threads_limit` items
+    are taken ahead of the consumer, so a slow consumer slows the
+    threads down, and closing the generator stops them.
+    Input:-
+    function: a callable taking one item.
+    items: an iterable of items.
+    threads_limit: the limit of working threads.
+    Output:-
+    a generator of results.
+    """
+
+    items = iter(items)
+    if threads_limit <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    tasks = queue.Queue()
+    done = queue.Queue()
+
+    def worker():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            index, item = task
+            try:
+                done.put((index, True, function(item)))
+            except Exception as error:
+                done.put((index, False, error))
+
+    workers = []
+    for _ in range(threads_limit):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+        workers.append(t)
+
+    submitted = 0
+    for item in items:
+        tasks.put((submitted, item))
+        submitted += 1
+        if submitted == threads_limit:
+            break
+
+    pending = {}
+    next_index = 0
+    try:
+        while next_index < submitted:
+            while next_index not in pending:
+                index, success, result = done.get()
+                pending[index] = (success, result)
+            success, result = pending.pop(next_index)
+            next_index += 1
+            if not success:
+                raise result
+            # Refill before yielding so the threads keep working while
+            # the consumer handles the result.
+            for item in items:
+                tasks.put((submitted, item))
+                submitted += 1
+                break
+            yield result
+    finally:
+        while True:
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                break
+        for _ in workers:
+            tasks.put(None)
+
+
+class Repository(object):
+    """
+    A repository and the API metadata kept through the pipeline.
+    """
+
+    __slots__ = ("URL", "full_name", "pushed_at", "updated_at", "default_branch",
+                 "size", "fork", "source", "language", "archived", "sha")
+
+    def __init__(self, URL, full_name=None, pushed_at=None, updated_at=None,
+                 default_branch=None, size=None, fork=False, source=None,
+                 language=None, archived=None, sha=None):
+        self.URL = URL
+        self.full_name = full_name
+        self.pushed_at = pushed_at
+        self.updated_at = updated_at
+        self.default_branch = default_branch
+        self.size = size  # KB, as reported by the API
+        self.fork = fork
+        self.source = source  # full_name of the root of the fork network
+        self.language = language
+        self.archived = archived
+        self.sha = sha  # head of the default branch, known for snapshots
+
+    def network(self):
+        """
+        Returns the full_name of the root of the repository's fork
+        network, or None if unknown.
+        """
+        if self.fork:
+            return self.source
+        return self.full_name
+
+    @classmethod
+    def fromResponse(cls, item, key):
+        """
+        Builds a Repository from an API list item, cloned from its `key` URL.
+        """
+        return cls(item[key],
+                   full_name=item.get("full_name"),
+                   pushed_at=item.get("pushed_at"),
+                   updated_at=item.get("updated_at"),
+                   default_branch=item.get("default_branch"),
+                   size=item.get("size"),
+                   fork=item.get("fork", False),
+                   source=(item.get("source") or {}).get("full_name"),
+                   language=item.get("language"),
+                   archived=item.get("archived"))
+
+    def toDict(self):
+        """
+        Returns the repository as a JSON-serializable dict.
+        """
+        return dict((field, getattr(self, field)) for field in self.__slots__)
+
+    @classmethod
+    def fromDict(cls, data):
         """
+        Builds a Repository from the output of `toDict`.
+        """
+        return cls(**dict((field, data.get(field)) for field in cls.__slots__))
+
+    def __repr__(self):
+        return "Repository({0!r})".format(self.URL)
+
+
+def repoName(repo):
+    """
+    Returns the lowercase "owner/name" of a repository, from its API
+    metadata or else from its URL. Gists are named by their id.
+    """
+    if repo.full_name:
+        return repo.full_name.lower()
+    path = repo.URL.split("://", 1)[-1].split("/")[1:]
+    path = [part for part in path if part]
+    if path and path[-1].endswith(".git"):
+        path[-1] = path[-1][:-4]
+    return "/".join(path[-2:]).lower()
+
+
+class RepoFilter(object):
+    """
+    A compiled repository filter, built from rule lines:
+    owner/name: excludes that repository.
+    name: excludes the repositories of that name, under any owner.
+    org/tmp-*: excludes the repositories matching a glob. Globs without
+    a "/" match the name under any owner.
+    re:^org/tmp-\\d+$: excludes the repositories whose owner/name matches
+    a regular expression.
+    +<rule>: an inclusion rule. Once there is one, only the repositories
+    matching an inclusion rule are kept.
+    min-size: / max-size: <KB>, language: / exclude-language: <a, b>,
+    archived: <true, false or any>, pushed-since: <date>: predicates on
+    the API metadata. Repositories without that metadata, e.g. gists,
+    pass them.
+    Names are case-insensitive; blank lines and "#" comments are ignored.
+    Exact names are looked up in sets and all globs are compiled into one
+    pattern, so long lists stay cheap to match. Regexes are compiled one
+    by one, keeping their own flags and group numbers.
+    """
+
+    PREDICATES = ("min-size", "max-size", "language", "exclude-language",
+                  "archived", "pushed-since")
+
+    def __init__(self, rules=()):
+        """
+        Input:-
+        rules: an iterable of rule lines.
+        Raises ValueError on an invalid rule.
+        """
+        self.min_size = None
+        self.max_size = None
+        self.languages = None
+        self.excluded_languages = set()
+        self.archived = None
+        self.pushed_since = None
+        exclude = ([], [], [])
+        include = ([], [], [])
+        for rule in rules:
+            rule = rule.strip()
+            if not rule or rule.startswith("#"):
+                continue
+            key, separator, value = rule.partition(":")
+            # A bare "language" is a repository name, not a predicate.
+            if separator and value.strip() and key.strip().lower() in self.PREDICATES:
+                self._predicate(key.strip().lower(), value.strip())
+            elif rule.startswith("+"):
+                self._pattern(rule[1:].strip(), include)
+            else:
+                self._pattern(rule, exclude)
+        self.excluded_names, self.exclude_patterns = self._compile(*exclude)
+        self.included_names, self.include_patterns = self._compile(*include)
+        self.has_includes = any(include)
+
+    @classmethod
+    def load(cls, path, rules=()):
+        """
+        Builds a RepoFilter from the rules of a file, followed by `rules`.
+        """
+        with open(path) as f:
+            return cls(f.read().splitlines() + list(rules))
+
+    def _predicate(self, key, value):
+        if key in ("min-size", "max-size"):
+            if not value.isdigit():
+                raise ValueError("{0} must be a size in KB: {1!r}".format(key, value))
+            setattr(self, key.replace("-", "_"), int(value))
+        elif key in ("language", "exclude-language"):
+            languages = set(language.strip().lower() for language in value.split(",")
+                            if language.strip())
+            if key == "language":
+                self.languages = (self.languages or set()) | languages
+            else:
+                self.excluded_languages |= languages
+        elif key == "archived":
+            if value.lower() not in ("true", "false", "any"):
+                raise ValueError("archived must be true, false or any: {0!r}".format(value))
+            self.archived = {"true": True, "false": False}.get(value.lower())
+        elif not re.match(r"^\d{4}-\d{2}-\d{2}", value):
+            raise ValueError("pushed-since must be a date, e.g. 2020-01-01: {0!r}".format(value))
+        else:
+            self.pushed_since = value
+
+    def _pattern(self, rule, patterns):
+        names, globs, regexes = patterns
+        if rule.startswith("re:"):
+            try:
+                regexes.append(re.compile(rule[3:], re.IGNORECASE))
+            except re.error as error:
+                raise ValueError("invalid regular expression {0!r}: {1}".format(rule[3:], error))
+        elif any(char in rule for char in "*?["):
+            glob = fnmatch.translate(rule.lower())
+            globs.append("^" + glob if "/" in rule else "^[^/]*/" + glob)
+        else:
+            names.append(rule.lower())
+
+    @staticmethod
+    def _compile(names, globs, regexes):
+        patterns = list(regexes)
+        if globs:
+            patterns.insert(0, re.compile("|".join("(?:{0})".format(glob) for glob in globs)))
+        return set(names), patterns
+
+    @staticmethod
+    def _matches(name, names, patterns):
+        if name in names or name.rsplit("/", 1)[-1] in names:
+            return True
+        return any(pattern.search(name) is not None for pattern in patterns)
+
+    def match(self, repo):
+        """
+        True if a Repository passes the filter.
+        """
+        name = repoName(repo)
+        if self._matches(name, self.excluded_names, self.exclude_patterns):
+            return False
+        if self.has_includes and not self._matches(name, self.included_names,
+                                                   self.include_patterns):
+            return False
+        if repo.size is not None:
+            if self.min_size is not None and repo.size < self.min_size:
+                return False
+            if self.max_size is not None and repo.size > self.max_size:
+                return False
+        if repo.language is not None:
+            language = repo.language.lower()
+            if self.languages is not None and language not in self.languages:
+                return False
+            if language in self.excluded_languages:
+                return False
+        if self.archived is not None and repo.archived is not None:
+            if repo.archived != self.archived:
+                return False
+        pushed_at = repo.pushed_at or repo.updated_at
+        if self.pushed_since is not None and pushed_at is not None:
+            # ISO 8601 timestamps compare as strings.
+            if pushed_at < self.pushed_since:
+                return False
+        return True
+
+
+class getReposURLs:
+    def __init__(self, api_prefix, exclude_repos=None,
+                 pool_size=10, max_retries=3, keep_alive=True,
+                 credentials=None, cache=None, retry=None, metrics=None,
+                 repo_filter=None):
+        self.user_agent = "GithubCloner (https://github.com/mazen160/GithubCloner)"
+        self.headers = {'User-Agent': self.user_agent, 'Accept': '*/*'}
+        self.timeout = 30
+        self.per_page = 100
+        self.api_prefix = api_prefix
+        self.repo_filter = repo_filter or RepoFilter(
+            [] if exclude_repos is None else exclude_repos.strip().split(','))
+        self.stats = ConnectionStats()
+        # `self.retry` is the only retry layer, so that it caps the attempts.
+        self.session = createSession(self.stats,
+                                     pool_size=pool_size,
+                                     max_retries=0,
+                                     keep_alive=keep_alive)
+        self.scheduler = RateLimitScheduler(credentials)
+        self.cache = cache
+        self.retry = retry or RetryPolicy(max_retries + 1)
+        self.failures = FailureReport()
+        self.metrics = metrics or Metrics()
+
+    def request(self, method, API, retry=True, **kwargs):
+        """
+        Sends a request through the shared session, retrying transient
+        connection errors with backoff unless `retry` is False, for
+        callers retrying on their own. Every attempt is timed in
+        `self.metrics`.
+        """
+
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.time()
+            try:
+                resp = self.session.request(method, API, timeout=self.timeout, **kwargs)
+                self.metrics.apiRequest(method, API, resp.status_code, time.time() - started)
+                return resp
+            except requests.exceptions.RequestException as error:
+                self.metrics.apiRequest(method, API, None, time.time() - started)
+                if not retry or not self.retry.retry(classifyError(error), attempt):
+                    raise
+
+    def get(self, API, username=None, token=None, rotate=True, cached=False,
+            headers=None, stream=False, retry=True):
+        """
+        Sends a GET request to the API through the shared session.
+        Waits for the rate limit to reset instead of returning a
+        rate-limited response.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        rotate: rotate between the credentials of the scheduler.
+        cached: revalidate the response against the response cache.
+        headers: extra request headers, e.g. a media type.
+        stream: do not download the body before returning.
+        retry: retry connection errors, False for callers retrying on their own.
+        """
+
+        extra_headers = headers or {}
+        while True:
+            credential = self.scheduler.acquire(username, token, rotate=rotate)
+            headers = dict(self.headers, **extra_headers)
+            entry = None
+            if cached and self.cache is not None:
+                entry = self.cache.lookup(API, credential[0])
+                if entry is not None:
+                    headers.update(self.cache.validators(entry))
+            if (credential[0] or credential[1]) is None:
+                resp = self.request("GET", API, retry=retry, headers=headers, stream=stream)
+            else:
+                resp = self.request("GET", API, retry=retry, headers=headers, stream=stream,
+                                    auth=credential)
+            if self.scheduler.update(credential, resp):
+                continue
+            if entry is not None and resp.status_code == 304:
+                return self.cache.revive(entry, resp)
+            if cached and self.cache is not None and resp.status_code == 200:
+                self.cache.store(API, resp, credential[0])
+            return resp
+
+    def filter_excluded_repos(self, url):
+        '''
+        True only if the url passes `self.repo_filter`
+        '''
+        return self.repo_filter.match(Repository(url))
+
+    def append_response(self, repos, resp, key, exclude_forked=False):
+        '''Append the repositories from response that pass `self.repo_filter`'''
+        for i, _ in enumerate(resp):
+            if exclude_forked and resp[i]['fork']:
+                continue
+            repo = Repository.fromResponse(resp[i], key)
+            if self.repo_filter.match(repo):
+                repos.append(repo)
+
+    def fetchPage(self, API, username=None, token=None, context=None, rotate=True):
+        """
+        Fetches one page of a list endpoint, retrying transient failures.
+        A page that still fails is recorded in `self.failures`.
+        Input:-
+        API: the page URL.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        context: a dict recorded with a failure, to retry it later.
+        rotate: rotate between the credentials of the scheduler.
+        Output:-
+        a (response, decoded JSON page) tuple, or None on failure.
+        """
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                resp = self.get(API, username=username, token=token, rotate=rotate,
+                                cached=True, retry=False)
+                page = json.loads(resp.text)
+            except requests.exceptions.RequestException as error:
+                error_class, message = classifyError(error), str(error)
+            except ValueError:
+                # e.g. the HTML error page of a proxy.
+                error_class = classifyStatus(resp.status_code) or "transient"
+                message = "HTTP {0}: invalid JSON".format(resp.status_code)
+            else:
+                if resp.status_code < 400 and isinstance(page, list):
+                    return resp, page
+                message = page.get("message") if isinstance(page, dict) else str(page)
+                if self.checkResponse(page) == 2:
+                    error_class = "not-found"
+                else:
+                    error_class = classifyStatus(resp.status_code) or "fatal"
+            if not self.retry.retry(error_class, attempt):
+                print("[!] Error: {0} failed: {1}".format(API, message))
+                self.failures.add("api", API, error_class, message,
+                                  attempts=attempt, **(context or {}))
+                return None
+
+    def paginate(self, API, username=None, token=None, context=None, rotate=True):
+        """
+        Yields every page of a paginated list endpoint.
+        Follows the `Link: rel="next"` header and stops at the last page
+        without requesting a trailing empty page. Every page is requested
+        with the same credential, since listings may depend on the user.
+        Input:-
+        API: list endpoint URL, without paging parameters.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        context: a dict recorded with a failure, to retry it later.
+        rotate: pick the credential from those of the scheduler; False for
+        listings of the authenticated user itself.
+        Output:-
+        a generator of decoded JSON pages.
+        """
+
+        if "per_page=" in API:
+            # A page URL, e.g. from a failure report.
+            base = API
+        else:
+            separator = "&" if "?" in API else "?"
+            base = "{0}{1}per_page={2}".format(API, separator, self.per_page)
+        API = base
+        username, token = self.scheduler.choose(base, username, token, rotate=rotate)
+        current_page = 1
+        while API is not None:
+            fetched = self.fetchPage(API, username=username, token=token,
+                                     context=context, rotate=False)
+            if fetched is None:
+                return
+            resp, page = fetched
+            yield page
+
+            if "next" in resp.links:
+                API = resp.links["next"]["url"]
+            elif "Link" not in resp.headers and len(page) >= self.per_page:
+                # No Link header (e.g. stripped by a proxy), fall back to
+                # page numbers, counting the pages followed by Link too.
+                API = "{0}&page={1}".format(base, current_page + 1)
+            else:
+                API = None
+            current_page += 1
+
+    def headCommit(self, full_name, branch=None):
+        """
+        Returns the head of a repository's default branch.
+        Both requests are revalidated against the response cache, so an
+        unchanged head does not count against the rate limit.
+        Input:-
+        full_name: the owner/name of the repository.
+        Optional Input:-
+        branch: the default branch, if known.
+        Output:-
+        a (branch, commit SHA) tuple.
+        Raises requests.exceptions.HTTPError on API errors.
+        """
+
+        API = "{0}/repos/{1}".format(self.api_prefix, full_name)
+        if branch is None:
+            resp = self.get(API, cached=True)
+            resp.raise_for_status()
+            branch = json.loads(resp.text)["default_branch"]
+        resp = self.get("{0}/commits/{1}".format(API, branch), cached=True,
+                        headers={"Accept": "application/vnd.github.sha"})
+        resp.raise_for_status()
+        return branch, resp.text.strip()
+
+    def archive(self, full_name, ref):
+        """
+        Requests the gzipped tarball of a repository at `ref`, following
+        the redirect to the download host.
+        Output:-
+        a streaming requests.Response instance.
+        Raises requests.exceptions.HTTPError on API errors.
+        """
+
+        resp = self.get("{0}/repos/{1}/tarball/{2}".format(self.api_prefix, full_name, ref),
+                        stream=True)
+        resp.raise_for_status()
+        return resp
+
+    def resolveSources(self, repos, username=None, token=None):
+        """
+        Fills in the fork network root of forked repositories, which list
+        endpoints do not return.
+        Input:-
+        repos: an iterable of Repository instances.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        Output:-
+        a generator of the same Repository instances.
+        """
+
+        for repo in repos:
+            if repo.fork and repo.source is None and repo.full_name:
+                API = "{0}/repos/{1}".format(self.api_prefix, repo.full_name)
+                try:
+                    resp = self.get(API, username=username, token=token, cached=True)
+                    repo.source = json.loads(resp.text)["source"]["full_name"]
+                except (requests.exceptions.RequestException,
+                        ValueError, KeyError, TypeError):
+                    pass
+            yield repo
+
+    def iterate(self, API, key, username=None, token=None, exclude_forked=False, rotate=True):
+        """
+        Yields a Repository, cloned from its `key` URL, for every item of
+        a paginated list endpoint, page by page as they arrive.
+        """
+
+        context = {"key": key, "exclude_forked": exclude_forked, "rotate": rotate}
+        for page in self.paginate(API, username=username, token=token, context=context,
+                                  rotate=rotate):
+            repos = []
+            self.append_response(repos, page, key, exclude_forked)
+            for repo in repos:
+                yield repo
+
+    def iterUserGists(self, user, username=None, token=None):
+        """
+        Yields the gists of a Github user as pages arrive.
+        See `UserGists`.
+        """
+
+        API = "{0}/users/{1}/gists".format(self.api_prefix, user)
+        return self.iterate(API, "git_pull_url", username=username, token=token)
+
+    def UserGists(self, user, username=None, token=None):
+        """
+        Returns a list of GIT URLs for accessible gists.
+        Input:-
+        user: Github user.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        Output:-
+        a list of Github gist repositories URLs.
+        """
+
+        return [repo.URL for repo in self.iterUserGists(user, username=username, token=token)]
+
+    def iterAuthenticatedGists(self, username, token):
+        """
+        Yields the gists of an authenticated user as pages arrive.
+        See `AuthenticatedGists`.
+        """
+
+        API = "{0}/gists".format(self.api_prefix)
+        return self.iterate(API, "git_pull_url", username=username, token=token,
+                            rotate=False)
+
+    def AuthenticatedGists(self, username, token):
+        """
+        Returns a list of gists of an authenticated user.
+        Input:-
+        username: Github username.
+        token: Github token or password.
+        Output:-
+        a list of Github gist repositories URLs.
+        """
+
+        return [repo.URL for repo in self.iterAuthenticatedGists(username, token)]
+
+    def iterUser(self, user, username=None, token=None, include_gists=False, exclude_forked=False):
+        """
+        Yields the repositories of a Github user as pages arrive.
+        See `fromUser`.
+        """
+
+        API = "{0}/users/{1}/repos".format(self.api_prefix, user)
+        for repo in self.iterate(API, "git_url", username=username, token=token,
+                                 exclude_forked=exclude_forked):
+            yield repo
+
+        if include_gists is True:
+            for repo in self.iterUserGists(user, username=username, token=token):
+                yield repo
+
+    def fromUser(self, user, username=None, token=None, include_gists=False, exclude_forked=False):
+        """
+        Retrieves a list of repositories for a Github user.
+        Input:-
+        user: Github username.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        Output:-
+        a list of Github repositories URLs.
+        """
+
+        return [repo.URL for repo in self.iterUser(user, username=username, token=token,
+                                                   include_gists=include_gists,
+                                                   exclude_forked=exclude_forked)]
+
+    def iterOrg(self, org_name, username=None, token=None, exclude_forked=False):
+        """
+        Yields the repositories of a Github organization as pages arrive.
+        See `fromOrg`.
+        """
+
+        API = "{0}/orgs/{1}/repos".format(self.api_prefix, org_name)
+        return self.iterate(API, "git_url", username=username, token=token,
+                            exclude_forked=exclude_forked)
+
+    def fromOrg(self, org_name, username=None, token=None, exclude_forked=False):
+        """
+        Retrieves a list of repositories for a Github organization.
+        Input:-
+        org_name: Github organization name.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        Output:-
+        a list of Github repositories URLs.
+        """
+
+        return [repo.URL for repo in self.iterOrg(org_name, username=username, token=token,
+                                                  exclude_forked=exclude_forked)]
+
+    def orgMembers(self, org_name, username=None, token=None):
+        """
+        Returns a list of the logins of a Github organization's members.
+        """
+
+        API = "{0}/orgs/{1}/members".format(self.api_prefix, org_name)
+        members = []
+        for page in self.paginate(API, username=username, token=token):
+            members.extend(member["login"] for member in page)
+        return members
+
+    def iterMembersRepos(self,
+                         org_name,
+                         username=None,
+                         token=None,
+                         include_gists=False,
+                         exclude_forked=False,
+                         threads_limit=1):
+        """
+        Enumerates the repositories of a Github organization's members
+        concurrently.
+        Input:-
+        org_name: Github organization name.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        threads_limit: the limit of members enumerated at once.
+        Output:-
+        a generator of (member, list of Repository instances) tuples,
+        in the order the API lists the members.
+        """
+
+        def enumerate_member(member):
+            return member, list(self.iterUser(member,
+                                              username=username,
+                                              token=token,
+                                              include_gists=include_gists,
+                                              exclude_forked=exclude_forked))
+
+        members = self.orgMembers(org_name, username=username, token=token)
+        return orderedThreadMap(enumerate_member, members, threads_limit)
+
+    def iterOrgIncludeUsers(self,
+                            org_name,
+                            username=None,
+                            token=None,
+                            include_gists=False,
+                            exclude_forked=False,
+                            threads_limit=1):
+        """
+        Yields the repositories of a Github organization and of its
+        members as they arrive. See `fromOrgIncludeUsers`.
+        """
+
+        for repo in self.iterOrg(org_name, username=username, token=token,
+                                 exclude_forked=exclude_forked):
+            yield repo
+
+        for _, member_repos in self.iterMembersRepos(org_name,
+                                                     username=username,
+                                                     token=token,
+                                                     include_gists=include_gists,
+                                                     exclude_forked=exclude_forked,
+                                                     threads_limit=threads_limit):
+            for repo in member_repos:
+                yield repo
+
+    def fromOrgIncludeUsers(self,
+                            org_name,
+                            username=None,
+                            token=None,
+                            include_gists=False,
+                            exclude_forked=False,
+                            threads_limit=1):
+        """
+        Retrieves a list of repositories for a Github organization
+        and repositories of the Github organization's members.
+        Input:-
+        org_name: Github organization name.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        threads_limit: the limit of members enumerated at once.
+        Output:-
+        a list of Github repositories URLs.
+        """
+
+        return [repo.URL for repo in self.iterOrgIncludeUsers(org_name,
+                                                              username=username,
+                                                              token=token,
+                                                              include_gists=include_gists,
+                                                              exclude_forked=exclude_forked,
+                                                              threads_limit=threads_limit)]
+
+    def checkAuthentication(self, username, token):
+        """
+        Checks whether an authentication credentials are valid or not.
+        Input:-
+        username: Github username.
+        token: Github token or password.
+        Output:-
+        True: if the authentication credentials are valid.
+        False: if the authentication credentials are invalid.
+        """
+
+        API = "{0}/user".format(self.api_prefix)
+        resp = self.get(API, username=username, token=token, rotate=False)
+        return resp.status_code == 200
+
+    def checkResponse(self, response):
+        """
+        Validates whether there an error in the response.
+        """
+        try:
+            if "API rate limit exceeded" in response["message"]:
+                print('[!] Error: Github API rate limit exceeded')
+                return 1
+        except TypeError:
+            pass
+
+        try:
+            if (response["message"] == "Not Found"):
+                return 2  # The organization does not exist
+        except TypeError:
+            pass
+
+        return 0
+
+    def iterAuthenticatedUser(self, username, token, exclude_forked):
+        """
+        Yields the Github repositories that an authenticated user has
+        access to as pages arrive. See `fromAuthenticatedUser`.
+        """
+
+        API = "{0}/user/repos?type=all".format(self.api_prefix)
+        return self.iterate(API, "git_url", username=username, token=token,
+                            exclude_forked=exclude_forked, rotate=False)
+
+    def fromAuthenticatedUser(self, username, token, exclude_forked):
+        """
+        Retrieves a list of Github repositories than an authenticated user
+        has access to.
+        Input:-
+        username: Github username.
+        token: Github token or password.
+        Output:-
+        a list of Github repositories URLs.
+        """
+
+        return [repo.URL for repo in self.iterAuthenticatedUser(username, token, exclude_forked)]
+
+
+GRAPHQL_REPOSITORY_FIELDS = """
+pageInfo { hasNextPage endCursor }
+nodes { url nameWithOwner isFork pushedAt updatedAt defaultBranchRef { name }
+        diskUsage isArchived primaryLanguage { name } }
+"""
+
+GRAPHQL_GIST_FIELDS = """
+pageInfo { hasNextPage endCursor }
+nodes { url updatedAt }
+"""
+
+GRAPHQL_ORG_REPOS = """
+query($login: String!, $cursor: String) {
+  organization(login: $login) {
+    repositories(first: 100, after: $cursor,
+                 orderBy: {field: CREATED_AT, direction: ASC}) {
+      %s
+    }
+  }
+}
+""" % GRAPHQL_REPOSITORY_FIELDS
+
+GRAPHQL_USER_REPOS = """
+query($login: String!, $cursor: String) {
+  user(login: $login) {
+    repositories(first: 100, after: $cursor, ownerAffiliations: OWNER,
+                 privacy: PUBLIC, orderBy: {field: NAME, direction: ASC}) {
+      %s
+    }
+  }
+}
+""" % GRAPHQL_REPOSITORY_FIELDS
+
+GRAPHQL_USER_GISTS = """
+query($login: String!, $cursor: String) {
+  user(login: $login) {
+    gists(first: 100, after: $cursor) {
+      %s
+    }
+  }
+}
+""" % GRAPHQL_GIST_FIELDS
+
+GRAPHQL_ORG_MEMBERS = """
+query($login: String!, $cursor: String, $gists: Boolean!) {
+  organization(login: $login) {
+    membersWithRole(first: 25, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        login
+        repositories(first: 100, ownerAffiliations: OWNER, privacy: PUBLIC,
+                     orderBy: {field: NAME, direction: ASC}) {
+          %s
+        }
+        gists(first: 100) @include(if: $gists) {
+          %s
+        }
+      }
+    }
+  }
+}
+""" % (GRAPHQL_REPOSITORY_FIELDS, GRAPHQL_GIST_FIELDS)
+
+
+class getReposURLsGraphQL(getReposURLs):
+    """
+    Enumerates repositories with batched GraphQL queries instead of
+    REST paging. Organization members are fetched together with their
+    first page of repositories and gists.
+    The GraphQL API requires authentication.
+    """
+
+    def __init__(self, api_prefix, *args, **kwargs):
+        getReposURLs.__init__(self, api_prefix, *args, **kwargs)
+        if api_prefix.rstrip("/").endswith("/v3"):
+            # Github Enterprise: https://host/api/v3 -> https://host/api/graphql
+            self.graphql_endpoint = api_prefix.rstrip("/")[:-3] + "/graphql"
+        else:
+            self.graphql_endpoint = api_prefix.rstrip("/") + "/graphql"
+
+    def graphql(self, query, variables, username=None, token=None, rotate=True):
+        """
+        Sends a GraphQL query.
+        Input:-
+        query: the GraphQL query.
+        variables: a dict of the query variables.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        rotate: rotate between the credentials of the scheduler.
+        Output:-
+        the "data" object of the response, or None on errors.
+        """
+
+        payload = {"query": query, "variables": variables}
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                while True:
+                    credential = self.scheduler.acquire(username, token, rotate=rotate,
+                                                        resource="graphql")
+                    resp = self.request("POST", self.graphql_endpoint,
+                                        retry=False,
+                                        json=payload,
+                                        headers=self.headers,
+                                        auth=credential)
+                    if not self.scheduler.update(credential, resp, resource="graphql"):
+                        break
+                data = json.loads(resp.text)
+            except requests.exceptions.RequestException as error:
+                error_class, message = classifyError(error), str(error)
+            except ValueError:
+                # e.g. the HTML error page of a proxy.
+                error_class = classifyStatus(resp.status_code) or "transient"
+                message = "HTTP {0}: invalid JSON".format(resp.status_code)
+            else:
+                errors = data.get("errors") if isinstance(data, dict) else None
+                if resp.status_code < 400 and isinstance(data, dict) and not errors:
+                    return data.get("data")
+                if errors:
+                    message = errors[0].get("message")
+                    error_type = errors[0].get("type")
+                else:
+                    message = data.get("message") if isinstance(data, dict) else str(data)
+                    error_type = None
+                if error_type == "NOT_FOUND":
+                    error_class = "not-found"
+                elif error_type == "RATE_LIMITED":
+                    error_class = "transient"
+                else:
+                    error_class = classifyStatus(resp.status_code) or "fatal"
+            if not self.retry.retry(error_class, attempt):
+                print("[!] Error: {0} failed: {1}".format(self.graphql_endpoint, message))
+                self.failures.add("api", self.graphql_endpoint, error_class, message,
+                                  attempts=attempt, variables=variables)
+                return None
+
+    def connection(self, query, owner_type, field, login,
+                   username=None, token=None, cursor=None):
+        """
+        Yields every node of a paginated GraphQL connection.
+        Input:-
+        query: a GraphQL query with $login and $cursor variables.
+        owner_type: "user" or "organization".
+        field: the connection field of the owner.
+        login: the login of the owner.
+        Optional Input:-
+        username: Github username.
+        token: Github token or password.
+        cursor: the cursor to start after.
+        Output:-
+        a generator of nodes.
+        """
+
+        username, token = self.scheduler.choose("{0}/{1}/{2}".format(owner_type, login, field),
+                                                username, token, resource="graphql")
+        while True:
+            data = self.graphql(query, {"login": login, "cursor": cursor},
+                                username=username, token=token, rotate=False)
+            if data is None or data.get(owner_type) is None:
+                return
+            page = data[owner_type][field]
+            for node in page["nodes"]:
+                yield node
+            if not page["pageInfo"]["hasNextPage"]:
+                return
+            cursor = page["pageInfo"]["endCursor"]
+
+    def appendRepositories(self, repos, nodes, exclude_forked=False):
+        """
+        Appends GraphQL repository nodes, mapped to the fields of the
+        REST API.
+        """
+        resp = [{"git_url": "git://{0}.git".format(node["url"].split("://", 1)[1]),
+                 "full_name": node["nameWithOwner"],
+                 "fork": node["isFork"],
+                 "pushed_at": node["pushedAt"],
+                 "updated_at": node["updatedAt"],
+                 "default_branch": (node["defaultBranchRef"] or {}).get("name"),
+                 "size": node.get("diskUsage"),
+                 "archived": node.get("isArchived"),
+                 "language": (node.get("primaryLanguage") or {}).get("name")}
+                for node in nodes]
+        self.append_response(repos, resp, "git_url", exclude_forked)
+
+    def iterRepositories(self, nodes, exclude_forked=False):
+        """
+        Yields the Repository of GraphQL repository nodes as they arrive.
+        """
+        for node in nodes:
+            repos = []
+            self.appendRepositories(repos, [node], exclude_forked)
+            for repo in repos:
+                yield repo
+
+    def appendGists(self, repos, nodes):
+        """
+        Appends GraphQL gist nodes, mapped to the fields of the REST API.
+        """
+        resp = [{"git_pull_url": node["url"] + ".git",
+                 "updated_at": node["updatedAt"]} for node in nodes]
+        self.append_response(repos, resp, "git_pull_url")
+
+    def iterUserGists(self, user, username=None, token=None):
+        """
+        GraphQL version of `getReposURLs.iterUserGists`.
+        """
+        repos = []
+        self.appendGists(repos, self.connection(GRAPHQL_USER_GISTS, "user",
+                                                "gists", user,
+                                                username=username, token=token))
+        return iter(repos)
+
+    def iterUser(self, user, username=None, token=None, include_gists=False, exclude_forked=False):
+        """
+        GraphQL version of `getReposURLs.iterUser`.
+        """
+        for repo in self.iterRepositories(
+                self.connection(GRAPHQL_USER_REPOS, "user", "repositories", user,
+                                username=username, token=token),
+                exclude_forked):
+            yield repo
+        if include_gists is True:
+            for repo in self.iterUserGists(user, username=username, token=token):
+                yield repo
+
+    def iterOrg(self, org_name, username=None, token=None, exclude_forked=False):
+        """
+        GraphQL version of `getReposURLs.iterOrg`.
+        """
+        return self.iterRepositories(
+            self.connection(GRAPHQL_ORG_REPOS, "organization", "repositories",
+                            org_name, username=username, token=token),
+            exclude_forked)
+
+    def iterMembersRepos(self,
+                         org_name,
+                         username=None,
+                         token=None,
+                         include_gists=False,
+                         exclude_forked=False,
+                         threads_limit=1):
+        """
+        Enumerates the repositories of a Github organization's members,
+        25 members per query. Members with more than one page of
+        repositories or gists are followed up individually.
+        Output:-
+        a generator of (member, list of Repository instances) tuples,
+        in the order the API lists the members.
+        """
+
+        cursor = None
+        credential = self.scheduler.choose("organization/{0}/membersWithRole".format(org_name),
+                                           username, token, resource="graphql")
+        while True:
+            data = self.graphql(GRAPHQL_ORG_MEMBERS,
+                                {"login": org_name, "cursor": cursor,
+                                 "gists": include_gists is True},
+                                username=credential[0], token=credential[1], rotate=False)
+            if data is None or data.get("organization") is None:
+                return
+            members = data["organization"]["membersWithRole"]
+            for member in members["nodes"]:
+                repos = []
+                repositories = member["repositories"]
+                self.appendRepositories(repos, repositories["nodes"], exclude_forked)
+                if repositories["pageInfo"]["hasNextPage"]:
+                    self.appendRepositories(
+                        repos,
+                        self.connection(GRAPHQL_USER_REPOS, "user",
+                                        "repositories", member["login"],
+                                        username=username, token=token,
+                                        cursor=repositories["pageInfo"]["endCursor"]),
+                        exclude_forked)
+                if include_gists is True:
+                    gists = member["gists"]
+                    self.appendGists(repos, gists["nodes"])
+                    if gists["pageInfo"]["hasNextPage"]:
+                        self.appendGists(
+                            repos,
+                            self.connection(GRAPHQL_USER_GISTS, "user",
+                                            "gists", member["login"],
+                                            username=username, token=token,
+                                            cursor=gists["pageInfo"]["endCursor"]))
+                yield member["login"], repos
+            if not members["pageInfo"]["hasNextPage"]:
+                return
+            cursor = members["pageInfo"]["endCursor"]
+
+
+def parseGitURL(URL, username=None, token=None):
+    """
+    This function parses the GIT URL.
+    """
+
+    URL = URL.replace("git://", "https://")
+    if (username or token) is not None:
+        URL = URL.replace(
+            "https://", "https://{0}:{1}@".format(username, token))
+    return URL
+
+
+def get_repopath(repo_username, repo_name, prefix_mode):
+    """
+    Returns a string of the repo path.
+    """
+    if prefix_mode == "none":
+        repopath = repo_name
+    elif prefix_mode == "underscore":
+        repopath = repo_username + "_" + repo_name
+    elif prefix_mode == "directory":
+        repopath = repo_username + "/" + repo_name
+    return repopath
+
+
+class StateIndex(object):
+    """
+    A JSON index, under the output path, of the upstream state of every
+    synced repository. Used by incremental runs to skip repositories that
+    have not changed since their last successful sync.
+    """
+
+    def __init__(self, path, autosave=100):
+        """
+        Input:-
+        path: the index file.
+        Optional Input:-
+        autosave: save after this many updates.
+        """
+        self.lock = threading.Lock()
+        self.path = path
+        self.autosave = autosave
+        self.pending = 0
+        try:
+            with open(path) as f:
+                self.repos = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.repos = {}
+
+    def _entry(self, repo, fullpath, mode):
+        """
+        Returns the entry of `repo` if it was last synced into `fullpath`
+        in `mode`, and the directory is still there.
+        """
+        with self.lock:
+            entry = self.repos.get(repo.URL)
+        if entry is None or entry.get("path") != fullpath or entry.get("mode") != mode:
+            return None
+        return entry if os.path.exists(fullpath) else None
+
+    def unchanged(self, repo, fullpath, mode="clone"):
+        """
+        True only if `repo` was synced into `fullpath` in `mode` ("clone",
+        "mirror" or "snapshot") and has not been pushed to or updated since.
+        """
+        entry = self._entry(repo, fullpath, mode)
+        if entry is None:
+            return False
+        if repo.pushed_at is None and repo.updated_at is None:
+            return False
+        return (entry.get("pushed_at") == repo.pushed_at and
+                entry.get("updated_at") == repo.updated_at and
+                entry.get("default_branch") == repo.default_branch)
+
+    def snapshot(self, repo, fullpath):
+        """
+        Returns the (default branch, commit SHA) of the snapshot of `repo`
+        last extracted into `fullpath`, or None.
+        """
+        entry = self._entry(repo, fullpath, "snapshot")
+        if entry is None or entry.get("sha") is None:
+            return None
+        return entry.get("default_branch"), entry["sha"]
+
+    def record(self, repo, fullpath, mode="clone"):
+        """
+        Records a successful sync of `repo` into `fullpath` in `mode`.
+        """
+        with self.lock:
+            self.repos[repo.URL] = {"full_name": repo.full_name,
+                                    "mode": mode,
+                                    "pushed_at": repo.pushed_at,
+                                    "updated_at": repo.updated_at,
+                                    "default_branch": repo.default_branch,
+                                    "sha": repo.sha,
+                                    "path": fullpath,
+                                    "synced_at": time.time()}
+            self.pending += 1
+            if self.pending >= self.autosave:
+                self._save()
+
+    def save(self):
+        """
+        Writes the index to disk.
+        """
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.repos, f)
+        os.rename(tmp, self.path)
+        self.pending = 0
+
+
+class Journal(object):
+    """
+    An append-only JSON-lines journal of the jobs of a run, under the
+    output path. Every repository is recorded as "queued" with its
+    metadata, then "started", then "done" or "failed", so an interrupted
+    run can be resumed without enumerating the API again. An
+    "enumerated" entry marks that every repository of the run was
+    queued; without it the journal only holds part of the run.
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        Input:-
+        path: the journal file.
+        Optional Input:-
+        resume: append to the existing journal instead of starting anew.
+        """
+        self.lock = threading.Lock()
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.file = open(path, "a" if resume else "w")
+        if resume and self.file.tell() > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a line torn by a crash.
+                    self.file.write("\n")
+
+    def _write(self, entry, sync=False):
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+
+    def queued(self, repo):
+        self._write({"state": "queued", "URL": repo.URL, "repo": repo.toDict()})
+
+    def started(self, repo):
+        self._write({"state": "started", "URL": repo.URL})
+
+    def finished(self, result):
+        state = "failed" if result.status == "failed" else "done"
+        self._write({"state": state, "URL": result.URL, "status": result.status,
+                     "error": result.error}, sync=True)
+
+    def enumerated(self):
+        self._write({"state": "enumerated"}, sync=True)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    @staticmethod
+    def complete(path):
+        """
+        True if a journal queued every repository of its run.
+        """
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith('{"state": "enumerated"'):
+                        return True
+        except (IOError, OSError):
+            pass
+        return False
+
+    @staticmethod
+    def load(path):
+        """
+        Reads a journal.
+        Input:-
+        path: the journal file.
+        Output:-
+        a list of (Repository, last state) tuples, in queue order.
+        """
+        repos = {}
+        states = {}
+        order = []
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A line torn by a crash.
+                    if "URL" not in entry:
+                        continue
+                    if entry["state"] == "queued" and entry["URL"] not in repos:
+                        repos[entry["URL"]] = Repository.fromDict(entry["repo"])
+                        order.append(entry["URL"])
+                    states[entry["URL"]] = entry["state"]
+        except (IOError, OSError):
+            pass
+        return [(repos[URL], states[URL]) for URL in order]
+
+
+def parseShard(value):
+    """
+    Parses a shard argument such as "2/8".
+    Output:-
+    an (index, count) tuple. Raises ValueError if it is invalid.
+    """
+    match = re.match(r"^(\d+)/(\d+)$", value.strip())
+    if match is None or not int(match.group(1)) < int(match.group(2)):
+        raise ValueError("a shard must be <index>/<count>, with 0 <= index < count: {0!r}".format(value))
+    return int(match.group(1)), int(match.group(2))
+
+
+def shardOf(repo, count):
+    """
+    Returns the shard of a repository among `count` shards, by rendezvous
+    hashing of its owner/name: the shard with the highest hash of
+    (owner/name, shard) wins. A repository only ever moves when shards
+    are added or removed, never when other repositories come and go.
+    """
+    name = repoName(repo)
+    return max(range(count), key=lambda shard: hashlib.sha1(
+        "{0}\n{1}".format(name, shard).encode("utf-8")).digest())
+
+
+class Manifest(object):
+    """
+    The repositories of a sweep, enumerated once, for worker processes
+    that each clone a shard of them.
+    """
+
+    def __init__(self, repos, created_at=None):
+        self.repos = list(repos)
+        self.created_at = created_at or time.time()
+        self.id = hashlib.sha1(json.dumps(
+            [self.created_at] + [repo.URL for repo in self.repos]).encode("utf-8")).hexdigest()[:12]
+
+    def shard(self, index, count):
+        """
+        Returns the repositories of shard `index` of `count`.
+        """
+        return [repo for repo in self.repos if shardOf(repo, count) == index]
+
+    def save(self, path):
+        """
+        Writes the manifest to disk.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"created_at": self.created_at,
+                       "repos": [repo.toDict() for repo in self.repos]}, f)
+        os.rename(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a manifest written by `save`.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        return cls([Repository.fromDict(repo) for repo in data["repos"]],
+                   created_at=data["created_at"])
+
+
+class ShardLease(object):
+    """
+    A lease on a shard of a manifest, kept as a lock file on the
+    filesystem shared by the workers. The holder touches the file every
+    `timeout / 4` seconds; a lease not touched for `timeout` seconds is
+    stale and may be taken over. A finished shard leaves a ".done" file.
+    """
+
+    def __init__(self, directory, manifest, shard, timeout=300):
+        """
+        Input:-
+        directory: the directory of the lock files.
+        manifest: a Manifest instance.
+        shard: an (index, count) tuple.
+        Optional Input:-
+        timeout: seconds without a heartbeat after which the lease is stale.
+        """
+        name = "{0}-shard-{1}-of-{2}".format(manifest.id, shard[0], shard[1])
+        self.path = os.path.join(directory, name + ".lock")
+        self.done_path = os.path.join(directory, name + ".done")
+        self.created_at = manifest.created_at
+        self.shard = shard
+        self.timeout = timeout
+        self.owner = json.dumps({"host": socket.gethostname(), "pid": os.getpid(),
+                                 "token": "{0:016x}".format(random.getrandbits(64))})
+        self.stopped = threading.Event()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def state(self):
+        """
+        Returns "done", "held", "stale", "free" or "abandoned": free for
+        longer than `timeout` since the manifest was written, e.g. when
+        its worker never started.
+        """
+        if os.path.exists(self.done_path):
+            return "done"
+        try:
+            age = time.time() - os.path.getmtime(self.path)
+        except OSError:
+            if time.time() - self.created_at > self.timeout:
+                return "abandoned"
+            return "free"
+        return "stale" if age > self.timeout else "held"
+
+    def holder(self):
+        """
+        Returns the host and pid holding the lease, as a string.
+        """
+        try:
+            with open(self.path) as f:
+                owner = json.load(f)
+            return "{0} (pid {1})".format(owner["host"], owner["pid"])
+        except (IOError, OSError, ValueError, KeyError):
+            return "unknown"
+
+    def acquire(self):
+        """
+        Takes the lease if it is free or stale.
+        Output:-
+        True: if the lease was taken.
+        False: if another worker holds it.
+        """
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+                if not self._breakStale():
+                    return False
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(self.owner)
+            thread = threading.Thread(target=self._heartbeat)
+            thread.daemon = True
+            thread.start()
+            return True
+
+    def _breakStale(self):
+        """
+        Removes a stale lock file. Renaming is atomic, so only one of the
+        workers racing for the lease removes it; a lock file renamed after
+        it was renewed is put back.
+        """
+        try:
+            with open(self.path) as f:
+                owner = f.read()
+            if time.time() - os.path.getmtime(self.path) <= self.timeout:
+                return False
+            stolen = "{0}.{1}".format(self.path, os.getpid())
+            os.rename(self.path, stolen)
+        except (IOError, OSError):
+            # Released or taken over meanwhile.
+            return not os.path.exists(self.path)
+        with open(stolen) as f:
+            renewed = f.read() != owner
+        if renewed:
+            try:
+                os.link(stolen, self.path)
+            except OSError:
+                pass
+        os.remove(stolen)
+        return not renewed
+
+    def _heartbeat(self):
+        while not self.stopped.wait(self.timeout / 4.0):
+            try:
+                os.utime(self.path, None)
+            except OSError:
+                pass
+
+    def release(self, done=False):
+        """
+        Gives up the lease.
+        Optional Input:-
+        done: mark the shard as finished.
+        """
+        self.stopped.set()
+        if done:
+            with open(self.done_path, "w") as f:
+                f.write(self.owner)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+TMP_SUFFIX = ".githubcloner-tmp"
+
+
+def removePartialClone(fullpath):
+    """
+    Removes the temporary directory of an interrupted clone of `fullpath`.
+    """
+    if os.path.exists(fullpath + TMP_SUFFIX):
+        shutil.rmtree(fullpath + TMP_SUFFIX, ignore_errors=True)
+
+
+def stateDirectory(cloningpath):
+    """
+    Returns the directory GithubCloner keeps its state in under the
+    output path.
+    """
+    return os.path.join(cloningpath, ".githubcloner")
+
+
+def repoFullPath(URL, cloningpath, prefix_mode="underscore"):
+    """
+    Returns the directory a GIT repository URL is cloned at.
+    """
+
+    repo_username = URL.split("/")[-2]
+    repo_name = URL.split("/")[-1]
+
+    repopath = get_repopath(repo_username, repo_name, prefix_mode)
+
+    if repopath.endswith(".git"):
+        repopath = repopath[:-4]
+
+    if '@' in repopath:
+        repopath = repopath.replace(repopath[:repopath.index("@") + 1], "")
+
+    return cloningpath + "/" + repopath
+
+
+def freeDiskSpace(path):
+    """
+    Returns the free disk space in bytes of the filesystem holding `path`.
+    """
+    if hasattr(os, "statvfs"):
+        stat = os.statvfs(path)
+        return stat.f_bavail * stat.f_frsize
+    return shutil.disk_usage(path).free
+
+
+def checkDiskSpace(repos, cloningpath, prefix_mode="underscore", mirror=False):
+    """
+    Compares the API reported size of the repositories that are not yet
+    cloned with the free disk space under the output path.
+    Input:-
+    repos: a list of Repository instances.
+    cloningpath: the output directory.
+    Optional Input:-
+    prefix_mode: the prefix mode of the repository directories.
+    mirror: the repositories are kept as bare mirrors.
+    Output:-
+    a (expected bytes, free bytes) tuple.
+    """
+    expected = 0
+    for repo in repos:
+        fullpath = repoFullPath(repo.URL, cloningpath, prefix_mode)
+        if mirror:
+            fullpath += ".git"
+        if not os.path.exists(fullpath):
+            expected += (repo.size or 0) * 1024
+    return expected, freeDiskSpace(cloningpath)
+
+
+def directorySize(path):
+    """
+    Returns the total size in bytes of the files under a directory.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class CloneOptions(object):
+    """
+    Options passed through to `git clone` and to the update of existing
+    repositories.
+    depth: create a shallow clone with that many commits.
+    filter: partial clone filter, e.g. "blob:none" or "tree:0".
+    single_branch: fetch the default branch only.
+    no_tags: do not fetch tags.
+    mirror: keep bare mirrors, sharing objects between forks.
+    snapshot: a getReposURLs instance to download the files of the default
+    branch through, as tarballs, instead of cloning. Gists are still cloned.
+    """
+
+    def __init__(self, depth=None, filter=None, single_branch=False, no_tags=False,
+                 mirror=False, snapshot=None):
+        self.depth = depth
+        self.filter = filter
+        self.single_branch = single_branch
+        self.no_tags = no_tags
+        self.mirror = mirror
+        self.snapshot = snapshot
+
+    def mode(self, repo):
+        """
+        Returns how `repo` is synced: "snapshot", "mirror" or "clone".
+        """
+        if self.snapshot is not None and repo.full_name:
+            return "snapshot"
+        return "mirror" if self.mirror else "clone"
+
+    def reduced(self):
+        """
+        True if the options fetch less than a full clone.
+        """
+        return bool(self.depth or self.filter or self.single_branch or self.no_tags)
+
+    def cloneArgs(self):
+        """
+        Returns the GitPython keyword arguments of `git clone`.
+        """
+        kwargs = {}
+        if self.depth:
+            kwargs["depth"] = self.depth
+        if self.filter:
+            kwargs["filter"] = self.filter
+        if self.single_branch:
+            kwargs["single_branch"] = True
+        if self.no_tags:
+            kwargs["no_tags"] = True
+        return kwargs
+
+    def pullArgs(self):
+        """
+        Returns the GitPython keyword arguments of `git pull`.
+        """
+        # The partial clone filter is stored in the repository's config by
+        # `git clone`, and later fetches pick it up from there.
+        kwargs = {}
+        if self.depth:
+            kwargs["depth"] = self.depth
+        if self.no_tags:
+            kwargs["no_tags"] = True
+        return kwargs
+
+
+def gitFlags(kwargs):
+    """
+    Converts GitPython-style keyword arguments into command line flags:
+    single_branch=True -> --single-branch, depth=1 -> --depth=1.
+    """
+    flags = []
+    for key in sorted(kwargs):
+        value = kwargs[key]
+        if value is None or value is False:
+            continue
+        flag = "--" + key.replace("_", "-")
+        flags.append(flag if value is True else "{0}={1}".format(flag, value))
+    return flags
+
+
+class GitError(Exception):
+    """
+    A failed git command of the git CLI engine.
+    """
+
+    def __init__(self, command, status, stderr):
+        self.command = command
+        self.status = status
+        self.stderr = stderr
+        Exception.__init__(self, "git {0} exited with {1}: {2}".format(
+            command, status, stderr.strip()))
+
+
+PROGRESS_PATTERN = re.compile(
+    r"(?P<phase>[A-Za-z ]+):\s+(?P<percent>\d+)% \((?P<done>\d+)/(?P<total>\d+)\)"
+    r"(?:, (?P<size>[\d.]+) (?P<unit>[KMG]?i?B))?")
+PROGRESS_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+
+
+def parseProgress(line):
+    """
+    Parses a git progress line such as
+    "Receiving objects:  45% (450/1000), 1.20 MiB | 2.00 MiB/s".
+    Output:-
+    a dict of phase, percent, done, total and bytes, or None.
+    """
+    match = PROGRESS_PATTERN.search(line)
+    if match is None:
+        return None
+    progress = {"phase": match.group("phase").strip(),
+                "percent": int(match.group("percent")),
+                "done": int(match.group("done")),
+                "total": int(match.group("total")),
+                "bytes": None}
+    if match.group("size"):
+        progress["bytes"] = int(float(match.group("size")) *
+                                PROGRESS_UNITS.get(match.group("unit"), 1))
+    return progress
+
+
+def gitConfigEnvironment(config):
+    """
+    Returns the environment variables passing a dict of git config to
+    every git command (GIT_CONFIG_COUNT, git >= 2.31).
+    """
+    env = {}
+    if config:
+        env["GIT_CONFIG_COUNT"] = str(len(config))
+        for i, key in enumerate(sorted(config)):
+            env["GIT_CONFIG_KEY_{0}".format(i)] = key
+            env["GIT_CONFIG_VALUE_{0}".format(i)] = str(config[key])
+    return env
+
+
+class GitPythonEngine(object):
+    """
+    Runs git operations through GitPython.
+    """
+
+    name = "gitpython"
+
+    def __init__(self, config=None):
+        """
+        Optional Input:-
+        config: a dict of git config for every command, e.g. http.proxy.
+        """
+        import git
+        self.git = git
+        self.env = gitConfigEnvironment(config)
+
+    def repo(self, path):
+        repo = self.git.Repo(path)
+        repo.git.update_environment(**self.env)
+        return repo
+
+    def clone(self, URL, path, **kwargs):
+        self.git.Repo.clone_from(URL, path, env=self.env or None, **kwargs)
+
+    def pull(self, path, **kwargs):
+        self.repo(path).remote().pull(**kwargs)
+
+    def fetch(self, path, *args, **kwargs):
+        self.repo(path).git.fetch(*args, **kwargs)
+
+    def initBare(self, path):
+        self.git.Repo.init(path, bare=True, mkdir=True)
+
+    def command(self, path, *args):
+        """
+        Runs `git <args>` in `path` and returns its output.
+        """
+        return self.git.Git(path).execute(["git"] + list(args), env=self.env or None)
+
+
+class GitCLIEngine(object):
+    """
+    Runs git operations as plain `git` subprocesses, without GitPython.
+    Uses the v2 wire protocol and can run parallel fetches and report
+    parsed progress.
+    """
+
+    name = "git"
+
+    def __init__(self, protocol_version=2, fetch_jobs=None, progress=None, config=None):
+        """
+        Optional Input:-
+        protocol_version: the git wire protocol version.
+        fetch_jobs: the number of parallel fetch jobs (fetch.parallel).
+        progress: a callable receiving (path, parsed progress dict) updates.
+        config: a dict of git config for every command, e.g. http.proxy.
+        """
+        self.config = ["-c", "protocol.version={0}".format(protocol_version)]
+        if fetch_jobs:
+            self.config += ["-c", "fetch.parallel={0}".format(fetch_jobs),
+                            "-c", "submodule.fetchJobs={0}".format(fetch_jobs)]
+        for key in sorted(config or {}):
+            self.config += ["-c", "{0}={1}".format(key, config[key])]
+        self.progress = progress
+        self.env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+
+    def run(self, args, cwd=None, progress_path=None):
+        """
+        Runs a git command.
+        Input:-
+        args: the git arguments.
+        Optional Input:-
+        cwd: the working directory.
+        progress_path: report progress of this repository to the progress
+        callable.
+        Output:-
+        the standard output of the command.
+        """
+        process = subprocess.Popen(["git"] + self.config + args,
+                                   cwd=cwd,
+                                   env=self.env,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        if progress_path is not None and self.progress is not None:
+            # Drain stdout meanwhile, so git never blocks on a full pipe.
+            output = []
+            reader = threading.Thread(target=lambda: output.append(process.stdout.read()))
+            reader.daemon = True
+            reader.start()
+            stderr = []
+            buf = b""
+            while True:
+                chunk = process.stderr.read(256)
+                if not chunk:
+                    break
+                buf += chunk
+                # Progress lines are terminated by \r while they update.
+                lines = re.split(b"[\r\n]", buf)
+                buf = lines.pop()
+                for line in lines:
+                    line = line.decode("utf-8", "replace")
+                    stderr.append(line)
+                    progress = parseProgress(line)
+                    if progress is not None:
+                        self.progress(progress_path, progress)
+            stderr.append(buf.decode("utf-8", "replace"))
+            reader.join()
+            stdout = output[0]
+            process.wait()
+            stderr = "\n".join(line for line in stderr if line and
+                               parseProgress(line) is None)
+        else:
+            stdout, stderr = process.communicate()
+            stderr = stderr.decode("utf-8", "replace")
+        if process.returncode != 0:
+            raise GitError(args[0], process.returncode, stderr)
+        return stdout.decode("utf-8", "replace")
+
+    def clone(self, URL, path, **kwargs):
+        flags = gitFlags(kwargs)
+        if self.progress is not None:
+            flags.append("--progress")
+        self.run(["clone"] + flags + ["--", URL, path], progress_path=path)
+
+    def pull(self, path, **kwargs):
+        flags = gitFlags(kwargs)
+        if self.progress is not None:
+            flags.append("--progress")
+        self.run(["pull"] + flags + ["origin"], cwd=path, progress_path=path)
+
+    def fetch(self, path, *args, **kwargs):
+        self.run(["fetch"] + gitFlags(kwargs) + list(args), cwd=path)
+
+    def initBare(self, path):
+        self.run(["init", "--quiet", "--bare", path])
+
+    def command(self, path, *args):
+        """
+        Runs `git <args>` in `path` and returns its output.
+        """
+        return self.run(list(args), cwd=path)
+
+
+CLONE_ENGINES = {"gitpython": GitPythonEngine, "git": GitCLIEngine}
+default_engine = []
+
+
+def defaultEngine():
+    """
+    Returns the shared GitPython engine, importing GitPython on first use.
+    """
+    if not default_engine:
+        default_engine.append(GitPythonEngine())
+    return default_engine[0]
+
+
+THROTTLE_ERRORS = ("error: 429", "error: 503", "too many requests", "service unavailable",
+                   "connection reset", "rate limit", "abuse")
+
+
+def parseRate(value):
+    """
+    Parses a bandwidth such as "512K", "10M" or "1G" (bytes per second).
+    Raises ValueError if it is invalid.
+    """
+    match = re.match(r"^(\d+(?:\.\d+)?)([KMG]?)B?$", value.strip().upper())
+    if match is None:
+        raise ValueError("invalid rate {0!r}, e.g. 512K, 10M".format(value))
+    return int(float(match.group(1)) * 1024 ** " KMG".index(match.group(2) or " "))
+
+
+class TokenBucket(object):
+    """
+    A token bucket refilled at `rate` bytes per second, holding up to one
+    second of traffic.
+    """
+
+    def __init__(self, rate):
+        self.lock = threading.Lock()
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.updated = time.time()
+
+    def consume(self, amount):
+        """
+        Takes `amount` tokens, waiting until the bucket holds any. The
+        bucket may go into debt, which later callers wait out.
+        """
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens > 0:
+                    self.tokens -= amount
+                    return
+                wait = -self.tokens / self.rate
+            time.sleep(wait)
+
+
+class ThrottlingProxy(object):
+    """
+    A local HTTP proxy, passed to git as http.proxy, that limits the
+    bandwidth of clone traffic. HTTPS is tunneled with CONNECT and plain
+    HTTP forwarded; bytes from the server go through a token bucket
+    shared by all transfers and another one per connection.
+    """
+
+    def __init__(self, rate=None, transfer_rate=None):
+        """
+        Optional Input:-
+        rate: the aggregate bandwidth cap, in bytes per second.
+        transfer_rate: the bandwidth cap of a single connection.
+        """
+        self.bucket = TokenBucket(rate) if rate else None
+        self.transfer_rate = transfer_rate
+        self.server = None
+
+    def start(self):
+        """
+        Starts serving in a background thread and returns the proxy URL.
+        """
+        proxy = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                proxy.handle(self.request)
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return "http://127.0.0.1:{0}".format(self.server.server_address[1])
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def handle(self, client):
+        head = b""
+        while b"\r\n\r\n" not in head and len(head) < 65536:
+            chunk = client.recv(4096)
+            if not chunk:
+                return
+            head += chunk
+        request_line = head.split(b"\r\n", 1)[0].decode("latin-1").split()
+        if len(request_line) != 3:
+            return
+        method, target = request_line[0], request_line[1]
+        try:
+            if method == "CONNECT":
+                host, _, port = target.rpartition(":")
+                upstream = socket.create_connection((host, int(port)), timeout=60)
+                client.sendall(b"HTTP/1.1 200 Connection Established\r\n\r\n")
+                pending = head.split(b"\r\n\r\n", 1)[1]
+            else:
+                # Forward in origin form, one request per connection, so
+                # every request is rewritten here.
+                URL = urlparse(target)
+                upstream = socket.create_connection(
+                    (URL.hostname, URL.port or 80), timeout=60)
+                headers, _, body = head.partition(b"\r\n\r\n")
+                lines = ["{0} {1} {2}".format(
+                    method, (URL.path or "/") + ("?" + URL.query if URL.query else ""),
+                    request_line[2]).encode("latin-1")]
+                lines += [line for line in headers.split(b"\r\n")[1:]
+                          if not line.lower().startswith((b"connection:",
+                                                           b"proxy-connection:"))]
+                pending = b"\r\n".join(lines + [b"Connection: close", b"", body])
+        except (socket.error, ValueError):
+            client.sendall(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            return
+        if pending:
+            upstream.sendall(pending)
+
+        thread = threading.Thread(target=self.relay, args=(client, upstream))
+        thread.daemon = True
+        thread.start()
+        buckets = [self.bucket]
+        if self.transfer_rate:
+            buckets.append(TokenBucket(self.transfer_rate))
+        self.relay(upstream, client, [bucket for bucket in buckets if bucket is not None])
+        thread.join()
+        upstream.close()
+
+    def relay(self, source, destination, buckets=()):
+        """
+        Copies bytes until `source` closes, taking them from `buckets`.
+        """
+        try:
+            while True:
+                data = source.recv(16384)
+                if not data:
+                    break
+                for bucket in buckets:
+                    bucket.consume(len(data))
+                destination.sendall(data)
+        except socket.error:
+            pass
+        for sock in (source, destination):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+class TrafficShaper(object):
+    """
+    Caps the concurrent transfers per git host, and slows a host down
+    when it pushes back: a 429 or 503, or a reset connection, halves the
+    host's cap and pauses it with a growing backoff; every cap's worth
+    of successful transfers raises the cap by one again.
+    """
+
+    def __init__(self, max_per_host=0, base_delay=5.0, max_delay=300.0):
+        """
+        Optional Input:-
+        max_per_host: the cap on concurrent transfers per host, 0 for none.
+        base_delay: the pause of a host after its first push back, in seconds.
+        max_delay: the cap on a single pause, in seconds.
+        """
+        self.condition = threading.Condition()
+        self.max_per_host = max_per_host
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hosts = {}
+
+    @staticmethod
+    def host(URL):
+        """
+        Returns the host of a GIT URL, without credentials.
+        """
+        if "://" not in URL:
+            # scp-like syntax: git@host:owner/name.git
+            return URL.split("@")[-1].split(":")[0]
+        return urlparse(URL).netloc.split("@")[-1] or "localhost"
+
+    def _state(self, host):
+        return self.hosts.setdefault(host, {"limit": self.max_per_host or None,
+                                            "active": 0,
+                                            "successes": 0,
+                                            "backoffs": 0,
+                                            "not_before": 0.0})
+
+    def acquire(self, URL):
+        """
+        Blocks until the host of `URL` accepts another transfer.
+        """
+        with self.condition:
+            state = self._state(self.host(URL))
+            while True:
+                wait = state["not_before"] - time.time()
+                if wait <= 0 and (state["limit"] is None or state["active"] < state["limit"]):
+                    state["active"] += 1
+                    return
+                self.condition.wait(wait if wait > 0 else None)
+
+    def release(self, URL, error=None):
+        """
+        Ends a transfer started with `acquire`.
+        Optional Input:-
+        error: the exception the transfer failed with.
+        """
+        with self.condition:
+            host = self.host(URL)
+            state = self._state(host)
+            state["active"] -= 1
+            if error is not None and self.throttled(error):
+                state["limit"] = max(min(state["limit"] or state["active"] + 1,
+                                         state["active"] + 1) // 2, 1)
+                delay = min(self.max_delay, self.base_delay * 2 ** state["backoffs"])
+                state["not_before"] = time.time() + random.uniform(delay / 2, delay)
+                state["backoffs"] += 1
+                state["successes"] = 0
+                print("[!] {0} is pushing back, {1} concurrent transfers from now on.".format(
+                    host, state["limit"]))
+            elif error is None:
+                state["backoffs"] = 0
+                state["successes"] += 1
+                if state["limit"] is not None and state["successes"] >= state["limit"]:
+                    state["successes"] = 0
+                    if not self.max_per_host or state["limit"] < self.max_per_host:
+                        state["limit"] += 1
+            self.condition.notify_all()
+
+    @staticmethod
+    def throttled(error):
+        """
+        True if an error shows the server pushing back.
+        """
+        response = getattr(error, "response", None)
+        if response is not None:
+            return response.status_code in (429, 503)
+        message = str(error).lower()
+        return any(pattern in message for pattern in THROTTLE_ERRORS)
+
+
+network_locks = {}
+network_locks_lock = threading.Lock()
+print_lock = threading.Lock()
+
+
+def networkLock(network):
+    """
+    Returns the lock serializing the repositories of a fork network.
+    """
+    with network_locks_lock:
+        return network_locks.setdefault(network, threading.Lock())
+
+
+def networkStore(cloningpath, network, engine):
+    """
+    Returns the path of the bare repository holding the objects shared
+    by a fork network, creating it if needed.
+    """
+    store = os.path.join(stateDirectory(cloningpath), "networks",
+                         network.replace("/", "_") + ".git")
+    if not os.path.exists(store):
+        engine.initBare(store)
+    return store
+
+
+def mirrorRepo(repo, URL, fullpath, cloningpath, engine):
+    """
+    Creates or updates a bare mirror of a repository.
+    Repositories of the same fork network borrow objects from a shared
+    store through `objects/info/alternates`: a new mirror is cloned with
+    `--reference` to the store, its objects are then added to the store
+    and dropped from the mirror, so every fork only costs what it does
+    not share with the rest of the network.
+    Input:-
+    repo: a Repository instance.
+    URL: the GIT URL to fetch from.
+    fullpath: the directory of the mirror.
+    cloningpath: the output directory.
+    engine: the clone engine.
+    Output:-
+    a ("cloned" or "updated", bytes fetched) tuple.
+    """
+
+    network = repo.network()
+    if network is None:
+        size_before = directorySize(fullpath)
+        if os.path.exists(fullpath):
+            engine.fetch(fullpath, "origin", prune=True)
+            status = "updated"
+        else:
+            removePartialClone(fullpath)
+            engine.clone(URL, fullpath + TMP_SUFFIX, mirror=True)
+            os.rename(fullpath + TMP_SUFFIX, fullpath)
+            status = "cloned"
+        return status, max(directorySize(fullpath) - size_before, 0)
+
+    with networkLock(network):
+        store = networkStore(cloningpath, network, engine)
+        size_before = directorySize(fullpath) + directorySize(store)
+        if os.path.exists(fullpath):
+            engine.fetch(fullpath, "origin", prune=True)
+            status = "updated"
+            clonepath = fullpath
+        else:
+            removePartialClone(fullpath)
+            clonepath = fullpath + TMP_SUFFIX
+            engine.clone(URL, clonepath, mirror=True, reference_if_able=store)
+            status = "cloned"
+        # Keep the mirror's objects reachable from the store. The fetch
+        # runs in the store, so the mirror's path must be absolute.
+        engine.fetch(store, os.path.abspath(clonepath),
+                     "+refs/*:refs/forks/{0}/*".format(repo.full_name), prune=True)
+        if status == "cloned":
+            # Local repack: drop objects now available from the store.
+            engine.command(clonepath, "repack", "-a", "-d", "-l", "-q")
+            os.rename(clonepath, fullpath)
+        size_after = directorySize(fullpath) + directorySize(store)
+    return status, max(size_after - size_before, 0)
+
+
+def extractTarball(fileobj, path):
+    """
+    Extracts a Github tarball from a stream into `path`, one member at a
+    time, without its top-level "owner-name-sha" directory.
+    Members that would land outside `path` (absolute paths, "..", links
+    pointing out of the tree) and hard links are skipped; devices and
+    other special files are never created.
+    Input:-
+    fileobj: a file-like object of the gzipped tarball.
+    path: the directory to extract into.
+    """
+
+    os.makedirs(path)
+    root = os.path.realpath(path)
+
+    def inside(target):
+        return target.startswith(root + os.sep)
+
+    with tarfile.open(fileobj=fileobj, mode="r|gz") as archive:
+        for member in archive:
+            name = member.name.split("/", 1)[1] if "/" in member.name else ""
+            target = os.path.abspath(os.path.join(root, name))
+            if not name or not inside(target):
+                continue
+            directory = target if member.isdir() else os.path.dirname(target)
+            try:
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+            except OSError:
+                continue  # e.g. under a file or a dangling link.
+            if member.isdir():
+                continue
+            # Resolve the links extracted so far, so no write goes through
+            # a link out of the tree.
+            directory = os.path.realpath(directory)
+            target = os.path.join(directory, os.path.basename(target))
+            if directory != root and not inside(directory):
+                continue
+            if os.path.lexists(target):
+                if os.path.isdir(target) and not os.path.islink(target):
+                    continue
+                os.remove(target)
+            if member.issym():
+                link = os.path.abspath(os.path.join(directory, member.linkname))
+                if not os.path.isabs(member.linkname) and inside(link):
+                    os.symlink(member.linkname, target)
+            elif member.isfile():
+                source = archive.extractfile(member)
+                with open(target, "wb") as f:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+                os.chmod(target, 0o755 if member.mode & 0o111 else 0o644)
+
+
+def snapshotRepo(repo, fullpath, api, index=None):
+    """
+    Replaces the directory of a repository with the files of its default
+    branch at HEAD, streamed from the API's tarball endpoint. The head
+    commit is checked first, and an unchanged snapshot is skipped.
+    Input:-
+    repo: a Repository instance with a full_name.
+    fullpath: the directory of the snapshot.
+    api: the getReposURLs instance to download through.
+    Optional Input:-
+    index: the StateIndex holding the SHA of the previous snapshot.
+    Output:-
+    a ("cloned", "updated" or "skipped", bytes downloaded) tuple.
+    """
+
+    repo.default_branch, repo.sha = api.headCommit(repo.full_name, repo.default_branch)
+    if index is not None and \
+            index.snapshot(repo, fullpath) == (repo.default_branch, repo.sha):
+        return "skipped", 0
+
+    removePartialClone(fullpath)
+    resp = api.archive(repo.full_name, repo.sha)
+    try:
+        resp.raw.decode_content = True
+        extractTarball(resp.raw, fullpath + TMP_SUFFIX)
+        downloaded = resp.raw.tell()
+    finally:
+        resp.close()
+
+    if not os.path.exists(fullpath):
+        os.rename(fullpath + TMP_SUFFIX, fullpath)
+        return "cloned", downloaded
+    # Swap the directories, so `fullpath` never holds half a snapshot.
+    old = fullpath + TMP_SUFFIX + "-old"
+    shutil.rmtree(old, ignore_errors=True)
+    os.rename(fullpath, old)
+    os.rename(fullpath + TMP_SUFFIX, fullpath)
+    shutil.rmtree(old, ignore_errors=True)
+    return "updated", downloaded
+
+
+class CloneResult(object):
+    """
+    The outcome of cloning or updating a single repository.
+    status: "cloned", "updated", "skipped" or "failed".
+    duration: seconds spent.
+    bytes: growth of the repository's object store, i.e. bytes fetched.
+    saved_bytes, saved_time: estimated savings of the clone options over
+    a full clone, based on the size reported by the API.
+    attempts: the number of attempts made.
+    error_class: the classifyError class of a failure.
+    """
+
+    def __init__(self, URL, path=None, status="failed", duration=0.0,
+                 bytes=0, error=None):
+        self.URL = URL
+        self.repo = None
+        self.path = path
+        self.status = status
+        self.duration = duration
+        self.bytes = bytes
+        self.error = error
+        self.error_class = None
+        self.attempts = 0
+        self.saved_bytes = 0
+        self.saved_time = 0.0
+
+    def estimateSavings(self, repo):
+        """
+        Estimates the bytes and time a full clone of `repo` would have
+        cost on top of this clone, from its API-reported size and the
+        observed transfer rate.
+        """
+        if self.status != "cloned" or not repo.size:
+            return
+        self.saved_bytes = max(repo.size * 1024 - self.bytes, 0)
+        if self.bytes and self.duration:
+            self.saved_time = self.saved_bytes / (self.bytes / self.duration)
+
+    def __repr__(self):
+        return "CloneResult({0!r}, status={1!r}, duration={2:.2f}, bytes={3})".format(
+            self.URL, self.status, self.duration, self.bytes)
+
+
+def directoryMode(path):
+    """
+    Returns how the directory of a repository was synced: "clone",
+    "mirror", "snapshot" (a plain file tree), or None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(os.path.join(path, ".git")):
+        return "clone"
+    if gitDirectory(path) == path:
+        return "mirror"
+    return "snapshot"
+
+
+def syncRepo(repo, URL, fullpath, cloningpath, options, engine, index=None):
+    """
+    Clones a repository, or updates an existing clone.
+    Input:-
+    repo: a Repository instance.
+    URL: the GIT URL to fetch from.
+    fullpath: the directory of the repository.
+    cloningpath: the output directory.
+    options: a CloneOptions instance.
+    engine: the clone engine.
+    Optional Input:-
+    index: the StateIndex of the output directory.
+    Output:-
+    a ("cloned", "updated" or "skipped", bytes fetched) tuple.
+    Raises ValueError if `fullpath` was synced in another mode.
+    """
+
+    mode = options.mode(repo)
+    existing = directoryMode(fullpath)
+    if existing is not None and existing != mode:
+        raise ValueError("{0} holds a {1}, not a {2}: move it away, or sync it with"
+                         " the same --snapshot and --mirror options as before".format(
+                             fullpath, existing, mode))
+    if options.snapshot is not None and repo.full_name:
+        return snapshotRepo(repo, fullpath, options.snapshot, index)
+    if options.mirror:
+        return mirrorRepo(repo, URL, fullpath, cloningpath, engine)
+
+    if os.path.exists(fullpath):
+        size_before = directorySize(os.path.join(fullpath, ".git"))
+        engine.pull(fullpath, **options.pullArgs())
+        status = "updated"
+    else:
+        size_before = 0
+        # Clone aside and rename into place, so `fullpath` only ever
+        # holds a complete repository.
+        removePartialClone(fullpath)
+        engine.clone(URL, fullpath + TMP_SUFFIX, **options.cloneArgs())
+        os.rename(fullpath + TMP_SUFFIX, fullpath)
+        status = "cloned"
+    return status, max(directorySize(os.path.join(fullpath, ".git")) - size_before, 0)
+
+
+def cloneRepo(URL,
+              cloningpath,
+              username=None,
+              token=None,
+              prefix_mode="underscore",
+              index=None,
+              options=None,
+              retry=None,
+              engine=None,
+              metrics=None,
+              shaper=None):
+    """
+    Clones a single GIT repository.
+    Transient failures are retried with backoff.
+    Input:-
+    URL: GIT repository URL, or a Repository instance.
+    cloningPath: the directory that the repository will be cloned at.
+    Optional Input:-
+    username: Github username.
+    token: Github token or password.
+    index: a StateIndex to record the synced state in.
+    options: a CloneOptions instance.
+    retry: a RetryPolicy instance.
+    engine: the clone engine (Default: GitPythonEngine).
+    metrics: a Metrics instance to record the result in.
+    shaper: a TrafficShaper instance limiting the transfers per host.
+    Output:-
+    a CloneResult instance.
+    """
+
+    repo = URL if isinstance(URL, Repository) else Repository(URL)
+    URL = repo.URL
+    options = options or CloneOptions()
+    retry = retry or RetryPolicy()
+    engine = engine or defaultEngine()
+    result = CloneResult(URL)
+    result.repo = repo
+    started = time.time()
+    try:
+        try:
+            if not os.path.exists(cloningpath):
+                os.mkdir(cloningpath)
+            if prefix_mode == "directory":
+                repo_username = URL.split("/")[-2]
+                if not os.path.exists(cloningpath + "/" + repo_username):
+                    os.mkdir(cloningpath + "/" + repo_username)
+        except Exception:
+            print("Error: There is an error in creating directories")
+
+        URL = parseGitURL(URL, username=username, token=token)
+
+        fullpath = repoFullPath(URL, cloningpath, prefix_mode)
+        if options.mirror:
+            fullpath += ".git"
+        result.path = fullpath
+        with print_lock:
+            print(fullpath)
+
+        while True:
+            result.attempts += 1
+            if shaper is not None:
+                shaper.acquire(URL)
+            try:
+                result.status, result.bytes = syncRepo(repo, URL, fullpath,
+                                                       cloningpath, options, engine,
+                                                       index=index)
+            except Exception as e:
+                if shaper is not None:
+                    shaper.release(URL, e)
+                if not retry.retry(classifyError(e), result.attempts):
+                    raise
+                print("[!] Retrying {0} ({1}/{2}): {3}".format(
+                    fullpath, result.attempts + 1, retry.max_attempts,
+                    str(e).strip().splitlines()[-1]))
+            else:
+                if shaper is not None:
+                    shaper.release(URL)
+                break
+        result.duration = time.time() - started
+        if options.reduced():
+            result.estimateSavings(repo)
+            if result.saved_bytes:
+                print("[*] {0}: fetched {1} KB in {2:.1f}s, ~{3} KB and ~{4:.1f}s"
+                      " saved over a full clone".format(
+                          fullpath, result.bytes // 1024, result.duration,
+                          result.saved_bytes // 1024, result.saved_time))
+        if index is not None:
+            index.record(repo, fullpath, options.mode(repo))
+    except Exception as e:
+        with print_lock:
+            print(e)
+            print("Error: There was an error in cloning [{}]".format(URL))
+        result.status = "failed"
+        result.error = str(e)
+        result.error_class = classifyError(e)
+    result.duration = time.time() - started
+    if metrics is not None:
+        metrics.clone(result)
+    return result
+
+
+def uniqueItems(items, key=None):
+    """
+    Yields the items of an iterable, skipping repeats, in order.
+    Optional Input:-
+    key: a callable returning the value items are compared by.
+    """
+    seen = set()
+    for item in items:
+        value = item if key is None else key(item)
+        if value not in seen:
+            seen.add(value)
+            yield item
+
+
+def cpuTimes():
+    """
+    Returns the (total, idle, iowait) CPU jiffies from /proc/stat,
+    or None where it is not available.
+    """
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(field) for field in f.readline().split()[1:]]
+    except (IOError, OSError, ValueError):
+        return None
+    return sum(fields), fields[3], fields[4] if len(fields) > 4 else 0
+
+
+class AdaptiveConcurrency(object):
+    """
+    Adjusts the number of clone workers by hill climbing on throughput.
+    Every `interval` seconds the completed repositories per second are
+    compared with the previous window: the last change is kept going if
+    it helped and reversed otherwise. The worker count is cut back when
+    failures pile up or the CPU or disk is saturated.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=64, interval=5.0,
+                 max_failure_rate=0.2, max_cpu=0.95, max_iowait=0.3):
+        self.lock = threading.Lock()
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.interval = interval
+        self.max_failure_rate = max_failure_rate
+        self.max_cpu = max_cpu
+        self.max_iowait = max_iowait
+        self.direction = 1
+        self.last_throughput = None
+        self.window_start = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.cpu = cpuTimes()
+
+    def saturation(self):
+        """
+        Returns the (busy, iowait) CPU fractions since the last call.
+        """
+        previous, self.cpu = self.cpu, cpuTimes()
+        if previous is None or self.cpu is None:
+            return 0.0, 0.0
+        total = float(self.cpu[0] - previous[0]) or 1.0
+        idle = self.cpu[1] - previous[1]
+        iowait = self.cpu[2] - previous[2]
+        return 1 - (idle + iowait) / total, iowait / total
+
+    def record(self, result):
+        """
+        Records a finished job.
+        Input:-
+        result: a CloneResult instance.
+        Output:-
+        the worker count to run with.
+        """
+        with self.lock:
+            self.completed += 1
+            if result.status == "failed":
+                self.failed += 1
+            now = time.time()
+            if now - self.window_start >= self.interval:
+                self._adjust(now)
+            return self.limit
+
+    def _adjust(self, now):
+        throughput = self.completed / (now - self.window_start)
+        failure_rate = float(self.failed) / self.completed
+        busy, iowait = self.saturation()
+
+        if failure_rate > self.max_failure_rate or busy > self.max_cpu \
+                or iowait > self.max_iowait:
+            self.limit = int(self.limit * 0.75)
+            self.direction = -1
+        else:
+            if self.last_throughput is not None and \
+                    throughput < self.last_throughput * 1.05:
+                self.direction = -self.direction
+            if self.direction > 0:
+                self.limit += max(self.limit // 4, 1)
+            else:
+                self.limit -= max(self.limit // 8, 1)
+        self.limit = min(max(self.limit, self.minimum), self.maximum)
+
+        self.last_throughput = throughput
+        self.window_start = now
+        self.completed = 0
+        self.failed = 0
+
+
+class WorkerPool(object):
+    """
+    A pool of worker threads fed from a priority work queue.
+    The number of workers is fixed, or steered by an AdaptiveConcurrency
+    controller. Queued jobs run lowest priority value first, then in
+    submission order. Results are returned in submission order.
+    """
+
+    def __init__(self, function, threads_limit, controller=None, max_pending=0,
+                 metrics=None, on_error=None):
+        """
+        Input:-
+        function: the callable run for every submitted job.
+        threads_limit: the number of worker threads.
+        Optional Input:-
+        controller: an AdaptiveConcurrency instance.
+        max_pending: the limit of queued jobs; `submit` blocks beyond it.
+        0 means unbounded.
+        metrics: a Metrics instance to record queue depth and utilization in.
+        on_error: a callable building the result of a job that raised,
+        from the exception and the job's arguments. By default the
+        exception itself is the result.
+        """
+        self.function = function
+        self.on_error = on_error
+        self.controller = controller
+        self.metrics = metrics
+        self.busy = 0
+        self.tasks = queue.PriorityQueue(max_pending)
+        self.results = {}
+        self.submitted = 0
+        self.lock = threading.Lock()
+        self.closed = False
+        self.size = 0
+        self.target = 0
+        self.threads = []
+        self.resize(threads_limit if controller is None else controller.limit)
+
+    def resize(self, threads_limit):
+        """
+        Sets the number of worker threads. Extra workers exit after
+        their current job.
+        """
+        with self.lock:
+            self.target = max(threads_limit, 1)
+            while self.size < self.target:
+                t = threading.Thread(target=self._worker)
+                t.daemon = True
+                t.start()
+                self.threads.append(t)
+                self.size += 1
+
+    def _worker(self):
+        started = time.time()
+        exited = False
+        try:
+            while True:
+                with self.lock:
+                    if self.size > self.target:
+                        self.size -= 1
+                        exited = True
+                        break
+                try:
+                    _, index, args, kwargs = self.tasks.get(timeout=0.2)
+                except queue.Empty:
+                    if self.closed:
+                        with self.lock:
+                            self.size -= 1
+                            exited = True
+                        break
+                    continue
+                job_started = time.time()
+                with self.lock:
+                    self.busy += 1
+                try:
+                    result = self.function(*args, **kwargs)
+                except Exception as error:
+                    self.results[index] = error
+                    if self.on_error is not None:
+                        result = self.on_error(error, *args, **kwargs)
+                    else:
+                        result = error
+                finally:
+                    with self.lock:
+                        self.busy -= 1
+                self.results[index] = result
+                if self.metrics is not None:
+                    self.metrics.pool(self.tasks.qsize(), self.busy, self.size,
+                                      time.time() - job_started)
+                if self.controller is not None:
+                    self.resize(self.controller.record(result))
+        finally:
+            if not exited:
+                # The worker died: replace it, so queued jobs still run.
+                with self.lock:
+                    self.size -= 1
+                if not self.closed:
+                    self.resize(self.target)
+        if self.metrics is not None:
+            self.metrics.workerExited(time.time() - started)
+
+    def submit(self, *args, **kwargs):
+        """
+        Queues a job, waiting for room if the queue is full.
+        """
+        self.submitPriority(0, *args, **kwargs)
+
+    def submitPriority(self, priority, *args, **kwargs):
+        """
+        Queues a job with a priority, waiting for room if the queue is full.
+        """
+        self.tasks.put((priority, self.submitted, args, kwargs))
+        self.submitted += 1
+
+    def join(self):
+        """
+        Waits for every queued job to finish and stops the workers.
+        Output:-
+        a list of the results, in submission order.
+        """
+        self.closed = True
+        while True:
+            with self.lock:
+                alive = [t for t in self.threads if t.is_alive()]
+            if not alive:
+                break
+            # A timed join keeps the main thread responsive to Ctrl-C.
+            alive[0].join(0.5)
+        return [self.results[index] for index in range(self.submitted)]
+
+
+def cloneBulkRepos(URLs,
+                   cloningPath,
+                   threads_limit=5,
+                   username=None,
+                   token=None,
+                   prefix_mode="underscore",
+                   controller=None,
+                   max_pending=0,
+                   index=None,
+                   incremental=False,
+                   options=None,
+                   journal=None,
+                   retry=None,
+                   engine=None,
+                   metrics=None,
+                   shaper=None):
+    """
+    Clones a bulk of GIT repositories.
+    Cloning starts with the first URL, so `URLs` may be a generator that
+    is still enumerating. Among queued repositories, the largest by API
+    reported size are cloned first.
+    Input:-
+    URLs: An iterable of GIT repository URLs or Repository instances.
+    cloningPath: the directory that the repository will be cloned at.
+    Optional Input:-
+    threads_limit: The limit of working threads.
+    username: Github username.
+    token: Github token or password.
+    controller: an AdaptiveConcurrency instance steering the working threads.
+    max_pending: the limit of URLs queued ahead of the working threads.
+    index: a StateIndex to record the synced state in.
+    incremental: skip repositories the index shows as unchanged upstream.
+    options: a CloneOptions instance.
+    journal: a Journal to record the progress of every repository in.
+    retry: a RetryPolicy instance.
+    engine: the clone engine (Default: GitPythonEngine).
+    metrics: a Metrics instance to record timings, queue depth and worker
+    utilization in.
+    shaper: a TrafficShaper instance limiting the transfers per host.
+    Output:-
+    a list of CloneResult instances, in the order of `URLs`, followed by
+    the skipped ones.
+    """
+
+    def job(repo, *args, **kwargs):
+        if journal is not None:
+            journal.started(repo)
+        result = cloneRepo(repo, *args, **kwargs)
+        if journal is not None:
+            journal.finished(result)
+        return result
+
+    def failed(error, repo, *args, **kwargs):
+        # e.g. the journal could not be written.
+        with print_lock:
+            print(error)
+            print("Error: There was an error in cloning [{}]".format(repo.URL))
+        result = CloneResult(repo.URL, status="failed", error=str(error))
+        result.repo = repo
+        result.error_class = classifyError(error)
+        return result
+
+    pool = WorkerPool(job, threads_limit, controller=controller,
+                      max_pending=max_pending, metrics=metrics, on_error=failed)
+    skipped = []
+    try:
+        for URL in URLs:
+            repo = URL if isinstance(URL, Repository) else Repository(URL)
+            if incremental and index is not None:
+                fullpath = repoFullPath(repo.URL, cloningPath, prefix_mode)
+                if options is not None and options.mirror:
+                    fullpath += ".git"
+                if index.unchanged(repo, fullpath, (options or CloneOptions()).mode(repo)):
+                    skipped.append(CloneResult(repo.URL, path=fullpath, status="skipped"))
+                    if metrics is not None:
+                        metrics.clone(skipped[-1])
+                    if journal is not None:
+                        journal.queued(repo)
+                        journal.finished(skipped[-1])
+                    continue
+            if journal is not None:
+                journal.queued(repo)
+            # Largest repositories first, so a big one does not start last.
+            pool.submitPriority(-(repo.size or 0), repo, cloningPath,
+                                username=username,
+                                token=token,
+                                prefix_mode=prefix_mode,
+                                index=index,
+                                options=options,
+                                retry=retry,
+                                engine=engine,
+                                metrics=metrics,
+                                shaper=shaper)
+        if journal is not None:
+            journal.enumerated()
+        return pool.join() + skipped
+    finally:
+        if index is not None:
+            index.save()
+        if journal is not None:
+            journal.close()
 
-        URLs = []
-        members = []
-        resp = []
-        current_page = 1
-        URLs.extend(self.fromOrg(org_name, username=username, token=token, exclude_forked=exclude_forked))
-
-        while (len(resp) != 0 or current_page == 1):
-            API = "{0}/orgs/{1}/members?per_page=40000000&page={2}".format(
-                self.api_prefix, org_name, current_page)
-            if (username or token) is None:
-                resp = requests.get(API,
-                                    headers=self.headers,
-                                    timeout=self.timeout).text
-            else:
-                resp = requests.get(API,
-                                    headers=self.headers,
-                                    timeout=self.timeout,
-                                    auth=(username, token)).text
-            resp = json.loads(resp)
 
-            if self.checkResponse(resp) != 0:
-                return []
+def gitDirectory(path):
+    """
+    Returns the GIT directory of a clone or a bare mirror, or None if
+    `path` is neither, e.g. a snapshot.
+    """
+    if os.path.isdir(os.path.join(path, ".git")):
+        return os.path.join(path, ".git")
+    if os.path.isdir(os.path.join(path, "objects")) and \
+            os.path.exists(os.path.join(path, "HEAD")):
+        return path
+    return None
 
-            current_page += 1
-            for i in range(len(resp)):
-                members.append(resp[i]["login"])
 
-        for member in members:
-            URLs.extend(self.fromUser(member,
-                                      username=username,
-                                      token=token,
-                                      include_gists=include_gists,
-                                      exclude_forked=exclude_forked))
+class MaintenanceResult(object):
+    """
+    The outcome of maintaining a single repository.
+    before, after: dicts of its packs, loose objects and bytes on disk.
+    """
 
-        return URLs
+    def __init__(self, path):
+        self.path = path
+        self.before = None
+        self.after = None
+        self.duration = 0.0
+        self.error = None
 
-    def checkAuthentication(self, username, token):
-        """
-        Checks whether an authentication credentials are valid or not.
-        Input:-
-        username: Github username.
-        token: Github token or password.
-        Output:-
-        True: if the authentication credentials are valid.
-        False: if the authentication credentials are invalid.
-        """
+    def __repr__(self):
+        return "MaintenanceResult({0!r}, before={1!r}, after={2!r})".format(
+            self.path, self.before, self.after)
 
-        API = "{0}/user".format(self.api_prefix)
-        resp = requests.get(API,
-                            auth=(username, token),
-                            timeout=self.timeout,
-                            headers=self.headers)
-        return resp.status_code == 200
 
-    def checkResponse(self, response):
-        """
-        Validates whether there an error in the response.
-        """
-        try:
-            if "API rate limit exceeded" in response["message"]:
-                print('[!] Error: Github API rate limit exceeded')
-                return 1
-        except TypeError:
-            pass
+def objectStats(path, engine):
+    """
+    Returns the packs, loose objects and bytes on disk of a repository.
+    """
+    stats = {}
+    for line in engine.command(path, "count-objects", "-v").splitlines():
+        key, _, value = line.partition(":")
+        stats[key.strip()] = value.strip()
+    return {"packs": int(stats.get("packs", 0)),
+            "loose": int(stats.get("count", 0)),
+            "bytes": directorySize(gitDirectory(path) or path)}
 
-        try:
-            if (response["message"] == "Not Found"):
-                return 2  # The organization does not exist
-        except TypeError:
-            pass
 
-        return 0
+def maintainRepo(path, engine=None, pack_threshold=16, loose_threshold=100, prune=True):
+    """
+    Maintains a repository so that later fetches and scans stay fast:
+    packs loose objects, repacks geometrically once there are more than
+    `pack_threshold` packs, prunes unreachable loose objects, and writes
+    an incremental commit-graph and a multi-pack-index.
+    Repacks are local (-l), so objects borrowed from a fork network
+    store are never copied or dropped.
+    Input:-
+    path: the repository.
+    Optional Input:-
+    engine: the clone engine (Default: GitPythonEngine).
+    pack_threshold: the number of packs above which to repack.
+    loose_threshold: the number of loose objects above which to pack them.
+    prune: prune unreachable loose objects older than two weeks. Must be
+    False for fork network stores, whose mirrors may still need them.
+    Output:-
+    a MaintenanceResult instance.
+    """
 
-    def fromAuthenticatedUser(self, username, token, exclude_forked):
-        """
-        Retrieves a list of Github repositories than an authenticated user
-        has access to.
-        Input:-
-        username: Github username.
-        token: Github token or password.
-        Output:-
-        a list of Github repositories URLs.
-        """
-        URLs = []
-        resp = []
-        current_page = 1
+    engine = engine or defaultEngine()
+    result = MaintenanceResult(path)
+    started = time.time()
+    try:
+        result.before = objectStats(path, engine)
+        if result.before["packs"] > pack_threshold:
+            try:
+                engine.command(path, "repack", "-d", "-l", "-q", "--geometric=2")
+            except Exception:
+                # git < 2.33: merge every local pack instead. -A keeps
+                # unreachable objects, loose, for `prune` to expire.
+                engine.command(path, "repack", "-A", "-d", "-l", "-q")
+        elif result.before["loose"] > loose_threshold:
+            engine.command(path, "repack", "-d", "-l", "-q")
+        if prune:
+            engine.command(path, "prune", "--expire=2.weeks.ago")
+        engine.command(path, "commit-graph", "write", "--reachable", "--split")
+        packs = os.path.join(gitDirectory(path) or path, "objects", "pack")
+        if any(name.endswith(".pack") for name in os.listdir(packs)):
+            engine.command(path, "multi-pack-index", "write")
+        result.after = objectStats(path, engine)
+    except Exception as e:
+        result.error = str(e)
+    result.duration = time.time() - started
+    return result
 
-        while (len(resp) != 0 or current_page == 1):
-            API = "{0}/user/repos?per_page=40000000&type=all&page={1}".format(
-                self.api_prefix, current_page)
-            resp = requests.get(API,
-                                headers=self.headers,
-                                timeout=self.timeout,
-                                auth=(username, token)).text
-            resp = json.loads(resp)
 
-            self.append_response(URLs, resp, "git_url", exclude_forked)
-            current_page += 1
-        return URLs
+def maintainBulkRepos(paths, threads_limit=2, engine=None, pack_threshold=16,
+                      stores=(), metrics=None):
+    """
+    Maintains a bulk of repositories on a worker pool of its own. Meant to
+    run once cloning is done, so it never competes with active clones.
+    Input:-
+    paths: the directories of the repositories. Directories that are not
+    GIT repositories are skipped.
+    Optional Input:-
+    threads_limit: The limit of working threads.
+    engine: the clone engine (Default: GitPythonEngine).
+    pack_threshold: the number of packs above which to repack.
+    stores: fork network stores, maintained without pruning.
+    metrics: a Metrics instance to record the results in.
+    Output:-
+    a list of MaintenanceResult instances.
+    """
 
+    def job(path, prune):
+        result = maintainRepo(path, engine=engine, pack_threshold=pack_threshold,
+                              prune=prune)
+        if metrics is not None:
+            metrics.event("maintenance", path=path, before=result.before,
+                          after=result.after, seconds=round(result.duration, 3),
+                          error=result.error)
+        return result
 
-def parseGitURL(URL, username=None, token=None):
+    pool = WorkerPool(job, threads_limit)
+    for path in paths:
+        if gitDirectory(path) is not None:
+            pool.submit(path, True)
+    for path in stores:
+        pool.submit(path, False)
+    return pool.join()
+
+
+class BundleIndex(object):
     """
-    This function parses the GIT URL.
+    The index of a bundle export directory. For every "owner/name" it
+    keeps the repository's path under the output path, whether it is a
+    bare mirror, its HEAD and origin URL, its refs as of the last export
+    and the chain of bundles, each with the refs it carries and the
+    commits it was built on top of (its basis, empty for a full bundle).
     """
 
-    URL = URL.replace("git://", "https://")
-    if (username or token) is not None:
-        URL = URL.replace(
-            "https://", "https://{0}:{1}@".format(username, token))
-    return URL
+    def __init__(self, path, repos=None):
+        self.path = path
+        self.repos = repos if repos is not None else {}
+
+    def entry(self, name):
+        """
+        Returns the entry of a repository, creating an empty one.
+        """
+        return self.repos.setdefault(name, {"path": None,
+                                            "bare": False,
+                                            "head": None,
+                                            "URL": None,
+                                            "refs": {},
+                                            "bundles": []})
+
+    def save(self):
+        """
+        Writes the index to disk.
+        """
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"repos": self.repos}, f, indent=1, sort_keys=True)
+        os.rename(self.path + ".tmp", self.path)
 
+    @classmethod
+    def load(cls, path):
+        """
+        Reads an index written by `save`, or returns an empty index if
+        there is none yet.
+        """
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path) as f:
+            return cls(path, json.load(f)["repos"])
 
-def get_repopath(repo_username, repo_name, prefix_mode):
+
+def listRefs(path, engine):
     """
-    Returns a string of the repo path.
+    Returns a {ref: object id} dict of the refs of a repository, without
+    symbolic refs such as refs/remotes/origin/HEAD.
     """
-    if prefix_mode == "none":
-        repopath = repo_name
-    elif prefix_mode == "underscore":
-        repopath = repo_username + "_" + repo_name
-    elif prefix_mode == "directory":
-        repopath = repo_username + "/" + repo_name
-    return repopath
+    refs = {}
+    output = engine.command(path, "for-each-ref", "--format=%(objectname) %(refname) %(symref)")
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            refs[parts[1]] = parts[0]
+    return refs
 
 
-def cloneRepo(URL,
-              cloningpath,
-              username=None,
-              token=None,
-              prefix_mode="underscore"):
+def exportBundle(path, directory, entry, name, engine=None):
     """
-    Clones a single GIT repository.
+    Writes the refs of a repository that changed since its last export
+    as a git bundle, on top of the commits of its previous refs. Falls
+    back to a full bundle when those commits are gone, e.g. after the
+    repository was cloned again. Refs moved to an already exported
+    object and deleted refs only change the index.
     Input:-
-    URL: GIT repository URL.
-    cloningPath: the directory that the repository will be cloned at.
+    path: the repository.
+    directory: the export directory.
+    entry: the BundleIndex entry of the repository, updated in place.
+    name: the "owner/name" of the repository.
     Optional Input:-
-    username: Github username.
-    token: Github token or password.
+    engine: the clone engine (Default: GitPythonEngine).
+    Output:-
+    the bytes written, 0 if no ref changed.
     """
 
+    engine = engine or defaultEngine()
+    refs = listRefs(path, engine)
+    changed = sorted(ref for ref in refs if entry["refs"].get(ref) != refs[ref])
     try:
-        try:
-            if not os.path.exists(cloningpath):
-                os.mkdir(cloningpath)
-            if prefix_mode == "directory":
-                repo_username = URL.split("/")[-2]
-                if not os.path.exists(cloningpath + "/" + repo_username):
-                    os.mkdir(cloningpath + "/" + repo_username)
-        except Exception:
-            print("Error: There is an error in creating directories")
+        entry["head"] = engine.command(path, "symbolic-ref", "-q", "HEAD").strip() or None
+    except Exception:
+        entry["head"] = None
+    basis = sorted(set(entry["refs"].values()))
+    # git refuses to bundle refs whose objects are all in the basis.
+    changed = [ref for ref in changed if refs[ref] not in basis]
+    if not changed:
+        entry["refs"] = refs
+        return 0
 
-        URL = parseGitURL(URL, username=username, token=token)
+    bundle = os.path.join(name, "{0:04d}.bundle".format(len(entry["bundles"]) + 1))
+    # git runs in the repository, so the bundle's path must be absolute.
+    bundle_path = os.path.abspath(os.path.join(directory, bundle))
+    if not os.path.exists(os.path.dirname(bundle_path)):
+        os.makedirs(os.path.dirname(bundle_path))
+    try:
+        engine.command(path, "bundle", "create", "-q", bundle_path + TMP_SUFFIX,
+                       *(changed + ["^" + sha for sha in basis]))
+    except Exception:
+        if not basis:
+            raise
+        basis = []
+        engine.command(path, "bundle", "create", "-q", bundle_path + TMP_SUFFIX, *changed)
+    os.rename(bundle_path + TMP_SUFFIX, bundle_path)
+    entry["bundles"].append({"file": bundle,
+                             "refs": dict((ref, refs[ref]) for ref in changed),
+                             "basis": basis,
+                             "created_at": time.time()})
+    entry["refs"] = refs
+    return os.path.getsize(bundle_path)
+
+
+def exportBundles(results, directory, cloningpath, index_name="index.json",
+                  threads_limit=2, engine=None, metrics=None):
+    """
+    Exports the repositories cloned by `cloneBulkRepos` as git bundles:
+    a full bundle on the first export, then bundles of the changed refs
+    only. A whole repository becomes a single file, copied with large
+    sequential writes instead of one per object or checked out file.
+    Input:-
+    results: the CloneResult instances of the clones.
+    directory: the export directory.
+    cloningpath: the output directory.
+    Optional Input:-
+    index_name: the file name of the index in `directory`.
+    threads_limit: The limit of working threads.
+    engine: the clone engine (Default: GitPythonEngine).
+    metrics: a Metrics instance to record the exports in.
+    Output:-
+    a list of (CloneResult, bytes written, error) tuples.
+    """
 
-        repo_username = URL.split("/")[-2]
-        repo_name = URL.split("/")[-1]
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    index = BundleIndex.load(os.path.join(directory, index_name))
 
-        repopath = get_repopath(repo_username, repo_name, prefix_mode)
+    def job(result, entry, name):
+        error = None
+        written = 0
+        try:
+            written = exportBundle(result.path, directory, entry, name, engine=engine)
+        except Exception as e:
+            error = str(e)
+        if metrics is not None:
+            metrics.event("bundle", path=result.path, bytes=written, error=error)
+        return result, written, error
 
-        if repopath.endswith(".git"):
-            repopath = repopath[:-4]
+    pool = WorkerPool(job, threads_limit)
+    for result in results:
+        if result.status == "failed" or not result.path or gitDirectory(result.path) is None:
+            continue
+        name = repoName(result.repo or Repository(result.URL))
+        entry = index.entry(name)
+        entry["path"] = os.path.relpath(result.path, cloningpath)
+        entry["bare"] = gitDirectory(result.path) == result.path
+        entry["URL"] = result.URL
+        pool.submit(result, entry, name)
+    exported = pool.join()
+    index.save()
+    return exported
 
-        if '@' in repopath:
-            repopath = repopath.replace(repopath[:repopath.index("@") + 1], "")
 
-        fullpath = cloningpath + "/" + repopath
-        with threading.Lock():
-            print(fullpath)
+def importBundle(directory, entry, cloningpath, engine=None):
+    """
+    Creates or updates a repository from its chain of bundles, fetching
+    the bundles it has not imported yet, then sets its refs to those of
+    the index. A new repository starts from the last full bundle of the
+    chain.
+    Input:-
+    directory: the export directory.
+    entry: the BundleIndex entry of the repository.
+    cloningpath: the output directory.
+    Optional Input:-
+    engine: the clone engine (Default: GitPythonEngine).
+    Output:-
+    "cloned", "updated" or "skipped".
+    """
 
-        if os.path.exists(fullpath):
-            git.Repo(fullpath).remote().pull()
+    engine = engine or defaultEngine()
+    path = os.path.join(cloningpath, entry["path"])
+    bundles = entry["bundles"]
+    if gitDirectory(path) is None:
+        if entry["bare"]:
+            engine.initBare(path)
         else:
-            git.Repo.clone_from(URL, fullpath)
-    except Exception as e:
-        print(e)
-        print("Error: There was an error in cloning [{}]".format(URL))
+            os.makedirs(path)
+            engine.command(path, "init", "-q")
+        if entry["URL"] and entry["bare"]:
+            engine.command(path, "remote", "add", "--mirror=fetch", "origin", entry["URL"])
+        elif entry["URL"]:
+            engine.command(path, "remote", "add", "origin", entry["URL"])
+        full = [i for i, bundle in enumerate(bundles) if not bundle["basis"]]
+        imported = full[-1] if full else 0
+        status = "cloned"
+    else:
+        try:
+            imported = int(engine.command(path, "config", "githubcloner.bundles"))
+        except Exception:
+            imported = 0
+        status = "updated"
 
+    for i in range(imported, len(bundles)):
+        engine.command(path, "fetch", "-q", "--update-head-ok",
+                       os.path.abspath(os.path.join(directory, bundles[i]["file"])),
+                       "+refs/*:refs/*")
+        engine.command(path, "config", "githubcloner.bundles", str(i + 1))
+    refs = listRefs(path, engine)
+    if imported >= len(bundles) and refs == entry["refs"]:
+        return "skipped"
+    for ref in sorted(set(refs) - set(entry["refs"])):
+        engine.command(path, "update-ref", "-d", ref)
+    for ref in sorted(entry["refs"]):
+        if refs.get(ref) != entry["refs"][ref]:
+            engine.command(path, "update-ref", ref, entry["refs"][ref])
+    if entry["head"]:
+        engine.command(path, "symbolic-ref", "HEAD", entry["head"])
+        if not entry["bare"] and entry["head"] in entry["refs"]:
+            engine.command(path, "reset", "-q", "--hard")
+    return status
 
-def cloneBulkRepos(URLs,
-                   cloningPath,
-                   threads_limit=5,
-                   username=None,
-                   token=None,
-                   prefix_mode="underscore"):
+
+def importBundles(directory, cloningpath, threads_limit=2, engine=None):
     """
-    Clones a bulk of GIT repositories.
+    Rebuilds or updates the repositories of an export directory under
+    the output path, from every index in it (one per shard).
     Input:-
-    URLs: A list of GIT repository URLs.
-    cloningPath: the directory that the repository will be cloned at.
+    directory: the export directory.
+    cloningpath: the output directory.
     Optional Input:-
     threads_limit: The limit of working threads.
-    username: Github username.
-    token: Github token or password.
+    engine: the clone engine (Default: GitPythonEngine).
+    Output:-
+    a list of ("owner/name", status, error) tuples.
     """
 
-    Q = queue.Queue()
-    threads_state = []
-    for URL in URLs:
-        Q.put(URL)
-    while Q.empty() is False:
-        if threading.active_count() < (threads_limit + 1):
-            t = threading.Thread(target=cloneRepo, args=(Q.get(), cloningPath,),
-                                 kwargs={"username": username,
-                                         "token": token,
-                                         "prefix_mode": prefix_mode})
-            t.daemon = True
-            t.start()
-        else:
-            time.sleep(0.5)
+    def job(name, entry):
+        try:
+            return name, importBundle(directory, entry, cloningpath, engine=engine), None
+        except Exception as e:
+            return name, "failed", str(e)
 
-            threads_state.append(t)
-    for _ in threads_state:
-        _.join()
+    pool = WorkerPool(job, threads_limit)
+    for index_name in sorted(os.listdir(directory)):
+        if index_name.startswith("index") and index_name.endswith(".json"):
+            index = BundleIndex.load(os.path.join(directory, index_name))
+            for name in sorted(index.repos):
+                pool.submit(name, index.repos[name])
+    return pool.join()
 
 
 def main():
@@ -453,9 +4056,159 @@ def main():
                         help="Threads used in cloning repositories (Default: 5).",
                         action='store',
                         default=5)
+    parser.add_argument("--adaptive-threads",
+                        dest="adaptive_threads",
+                        help="Adjust the cloning threads to the observed throughput,"
+                        " starting from --threads.",
+                        action='store_true')
+    parser.add_argument("--min-threads",
+                        dest="min_threads",
+                        help="Lower bound of --adaptive-threads (Default: 1).",
+                        action='store',
+                        type=int,
+                        default=1)
+    parser.add_argument("--max-threads",
+                        dest="max_threads",
+                        help="Upper bound of --adaptive-threads (Default: 64).",
+                        action='store',
+                        type=int,
+                        default=64)
+    parser.add_argument("--clone-depth",
+                        dest="clone_depth",
+                        help="Create shallow clones with that many commits.",
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument("--filter",
+                        dest="clone_filter",
+                        help="Partial clone filter: blob:none, tree:0.",
+                        action='store',
+                        choices=["blob:none", "tree:0"],
+                        default=None)
+    parser.add_argument("--single-branch",
+                        dest="single_branch",
+                        help="Clone the default branch only.",
+                        action='store_true')
+    parser.add_argument("--no-tags",
+                        dest="no_tags",
+                        help="Do not fetch tags.",
+                        action='store_true')
+    parser.add_argument("--mirror",
+                        dest="mirror",
+                        help="Keep bare mirrors; forks of the same repository"
+                        " share their objects.",
+                        action='store_true')
+    parser.add_argument("--snapshot",
+                        dest="snapshot",
+                        help="Download the files of the default branch as tarballs"
+                        " through the API instead of cloning; unchanged"
+                        " snapshots are skipped.",
+                        action='store_true')
+    parser.add_argument("--maintenance",
+                        dest="maintenance",
+                        help="Once cloning is done, write commit-graphs and"
+                        " multi-pack-indexes, repack and prune the repositories.",
+                        action='store_true')
+    parser.add_argument("--maintenance-threads",
+                        dest="maintenance_threads",
+                        help="Threads used in --maintenance (Default: 2).",
+                        action='store',
+                        type=int,
+                        default=2)
+    parser.add_argument("--pack-threshold",
+                        dest="pack_threshold",
+                        help="Packs above which --maintenance repacks a repository"
+                        " (Default: 16).",
+                        action='store',
+                        type=int,
+                        default=16)
+    parser.add_argument("--export-bundles",
+                        dest="export_bundles",
+                        help="Write every repository as a git bundle to this directory"
+                        " once cloning is done; later runs only bundle the changed refs.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--import-bundles",
+                        dest="import_bundles",
+                        help="Rebuild or update the output path from the bundles of"
+                        " --export-bundles in this directory, then exit.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--preflight",
+                        dest="preflight",
+                        help="Enumerate everything first and check that the expected"
+                        " size of the new repositories fits on disk.",
+                        action='store_true')
+    parser.add_argument("--resume",
+                        dest="resume",
+                        help="Resume the last interrupted run from its journal"
+                        " without enumerating the API again.",
+                        action='store_true')
+    parser.add_argument("--max-attempts",
+                        dest="max_attempts",
+                        help="Attempts at API requests and clones failing with"
+                        " transient errors (Default: 4).",
+                        action='store',
+                        type=int,
+                        default=4)
+    parser.add_argument("--retry-failed",
+                        dest="retry_failed",
+                        help="Retry only what failed in the last run, from its"
+                        " failure report.",
+                        action='store_true')
+    parser.add_argument("--clone-engine",
+                        dest="clone_engine",
+                        help="Runs git through: gitpython, git (plain git"
+                        " subprocesses) (Default: gitpython).",
+                        action='store',
+                        choices=sorted(CLONE_ENGINES),
+                        default="gitpython")
+    parser.add_argument("--fetch-jobs",
+                        dest="fetch_jobs",
+                        help="Parallel fetch jobs of the git clone engine.",
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument("--incremental",
+                        dest="incremental",
+                        help="Skip repositories not pushed to since their last sync.",
+                        action='store_true')
+    parser.add_argument("--max-pending",
+                        dest="max_pending",
+                        help="Repositories enumerated ahead of the cloning threads"
+                        " (Default: 100).",
+                        action='store',
+                        type=int,
+                        default=100)
+    parser.add_argument("--enum-threads",
+                        dest="enum_threads",
+                        help="Threads used in enumerating organization members"
+                        " (Default: 4).",
+                        action='store',
+                        type=int,
+                        default=4)
+    parser.add_argument("--max-per-host",
+                        dest="max_per_host",
+                        help="Concurrent transfers per git host, halved while the"
+                        " host pushes back (Default: unlimited).",
+                        action='store',
+                        type=int,
+                        default=0)
+    parser.add_argument("--max-rate",
+                        dest="max_rate",
+                        help="Bandwidth cap of all http(s) git transfers, e.g. 10M.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--max-transfer-rate",
+                        dest="max_transfer_rate",
+                        help="Bandwidth cap of a single http(s) git transfer, e.g. 1M.",
+                        action='store',
+                        default=None)
     parser.add_argument("-a", "--authentication",
                         dest="authentication",
-                        help="Github authentication credentials (username:token).",
+                        help="Github authentication credentials (username:token)."
+                        " Comma-separated credentials are rotated between to"
+                        " spread the API rate limit.",
                         action='store')
     parser.add_argument("--include-authenticated-repos",
                         dest="include_authenticated_repos",
@@ -484,14 +4237,119 @@ def main():
                         default="https://api.github.com")
     parser.add_argument("--exclude_repos",
                         dest="exclude_repos",
-                        help="Exclude a list of comma separated repos: 'repo1,repo2,...'",
+                        help="Exclude a list of comma separated repos: 'repo1,repo2,...'"
+                        " (names, owner/name, globs or re:<regex>)",
                         action="store")
+    parser.add_argument("--filter-file",
+                        dest="filter_file",
+                        help="Filter repositories by the rules of a file: names, globs,"
+                        " regexes, size, language, archived and pushed-since.",
+                        action="store",
+                        default=None)
     parser.add_argument("--exclude_forked",
                         dest="exclude_forked",
                         help="Exclude forked repositories",
                         action='store_true')
+    parser.add_argument("--api-backend",
+                        dest="api_backend",
+                        help="API used to enumerate repositories: rest, graphql"
+                        " (Default: rest). graphql requires --authentication.",
+                        action='store',
+                        choices=["rest", "graphql"],
+                        default="rest")
+    parser.add_argument("--http-pool-size",
+                        dest="http_pool_size",
+                        help="Keep-alive connections kept per API host (Default: 10).",
+                        action='store',
+                        type=int,
+                        default=10)
+    parser.add_argument("--http-retries",
+                        dest="http_retries",
+                        help="Retries of failed API requests (Default: --max-attempts"
+                        " minus one).",
+                        action='store',
+                        type=int,
+                        default=None)
+    parser.add_argument("--no-keep-alive",
+                        dest="no_keep_alive",
+                        help="Open a new connection for every API request.",
+                        action='store_true')
+    parser.add_argument("--cache-dir",
+                        dest="cache_dir",
+                        help="Directory of the API response cache"
+                        " (Default: ~/.cache/githubcloner).",
+                        action='store',
+                        default=None)
+    parser.add_argument("--cache-size",
+                        dest="cache_size",
+                        help="Size cap of the API response cache in MB (Default: 100).",
+                        action='store',
+                        type=int,
+                        default=100)
+    parser.add_argument("--no-cache",
+                        dest="no_cache",
+                        help="Do not cache API responses.",
+                        action='store_true')
+    parser.add_argument("--http-stats",
+                        dest="http_stats",
+                        help="Print the number of API requests and connections used.",
+                        action='store_true')
+    parser.add_argument("--metrics-log",
+                        dest="metrics_log",
+                        help="Append API request, clone, git phase and worker pool"
+                        " timings to a JSON-lines event log.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--metrics-textfile",
+                        dest="metrics_textfile",
+                        help="Write the metrics of the run to a Prometheus textfile.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--profile",
+                        dest="profile",
+                        help="Sample the stacks of all threads during the run and"
+                        " write the hot paths to a file, as collapsed stacks.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--write-manifest",
+                        dest="write_manifest",
+                        help="Enumerate the repositories into a work manifest for"
+                        " --manifest workers, then exit.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--manifest",
+                        dest="manifest",
+                        help="Clone a shard of the repositories of a work manifest"
+                        " instead of enumerating them.",
+                        action='store',
+                        default=None)
+    parser.add_argument("--shard",
+                        dest="shard",
+                        help="The shard of --manifest to clone, as index/count,"
+                        " e.g. 0/4 (Default: 0/1).",
+                        action='store',
+                        default=None)
+    parser.add_argument("--takeover",
+                        dest="takeover",
+                        help="After the shard, also clone the shards of --manifest"
+                        " whose worker stopped or never started.",
+                        action='store_true')
+    parser.add_argument("--lease-timeout",
+                        dest="lease_timeout",
+                        help="Seconds without a heartbeat after which a --manifest"
+                        " shard may be taken over (Default: 300).",
+                        action='store',
+                        type=int,
+                        default=300)
     args = parser.parse_args()
 
+    if args.profile:
+        profiler = SamplingProfiler()
+        profiler.start()
+        atexit.register(profiler.dump, args.profile)
+    metrics = Metrics(args.metrics_log, args.metrics_textfile)
+    atexit.register(metrics.close)
+
     users = args.users if args.users else None
     organizations = args.organizations if args.organizations else None
     include_organization_members = args.include_organization_members\
@@ -506,19 +4364,18 @@ def main():
     prefix_mode = args.prefix_mode
     api_prefix = args.api_prefix
     exclude_repos = args.exclude_repos if args.exclude_repos else None
-
-    if threads_limit > 10:
-        print("Error: Using more than 10 threads may cause errors."
-              "\nDecrease the amount of used threads.")
-        print("\nExiting....")
+    if args.min_threads < 1 or args.max_threads < args.min_threads:
+        print("Error: --min-threads must be at least 1 and at most --max-threads.")
+        print("\nExiting...")
         exit(1)
 
-    if (not args.output_path) and (not echo_urls):
+    if (not args.output_path) and (not echo_urls) and (not args.write_manifest):
         print("Error: The output path is not specified.")
         print("\nExiting...")
         exit(1)
 
-    if not (args.users or args.organizations):
+    if not (args.users or args.organizations or args.resume or args.retry_failed or
+            args.manifest or args.import_bundles):
         print("Error: Both Github users and Github organizations are not specified.")
         print("\nExiting...")
         exit(1)
@@ -528,7 +4385,19 @@ def main():
         print("\nExiting...")
         exit(1)
 
-    if not echo_urls:
+    shard = None
+    manifest = None
+    try:
+        if args.shard is not None:
+            shard = parseShard(args.shard)
+        if args.manifest:
+            manifest = Manifest.load(args.manifest)
+    except (IOError, OSError, ValueError, KeyError) as error:
+        print("Error: invalid --manifest or --shard: {0}".format(error))
+        print("\nExiting...")
+        exit(1)
+
+    if not echo_urls and output_path is not None:
         try:
             if not os.path.exists(output_path):
                 os.mkdir(output_path)
@@ -537,22 +4406,96 @@ def main():
             print(repr(error))
             exit(1)
 
+    if args.import_bundles:
+        if args.clone_engine == "git":
+            engine = GitCLIEngine()
+        else:
+            engine = GitPythonEngine()
+        imported = importBundles(args.import_bundles, output_path,
+                                 threads_limit=threads_limit, engine=engine)
+        print("[*] Bundles: {0} cloned, {1} updated, {2} skipped, {3} failed.".format(
+            sum(1 for _, status, _ in imported if status == "cloned"),
+            sum(1 for _, status, _ in imported if status == "updated"),
+            sum(1 for _, status, _ in imported if status == "skipped"),
+            sum(1 for _, status, _ in imported if status == "failed")))
+        for name, status, error in imported:
+            if error is not None:
+                print("[!] Import of {0} failed: {1}".format(
+                    name, error.strip().splitlines()[-1]))
+        return
+
+    credentials = []
     if authentication is not None:
-        if ':' not in authentication:
-            print('[!] Error: Incorrect authentication value, must be:'
-                  ' <username>:<password_or_personal_access_token>')
-            print('\nExiting...')
-            exit(1)
-        if getReposURLs(api_prefix,
-                        exclude_repos).checkAuthentication(
-                            authentication.split(":")[0],
-                            authentication.split(":")[1]) is False:
-            print("Error: authentication failed.")
+        for credential in authentication.split(","):
+            if ':' not in credential:
+                print('[!] Error: Incorrect authentication value, must be:'
+                      ' <username>:<password_or_personal_access_token>')
+                print('\nExiting...')
+                exit(1)
+            credentials.append(tuple(credential.split(":", 1)))
+
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = ResponseCache(args.cache_dir or defaultCachePath(),
+                                  max_size=args.cache_size * 1024 * 1024)
+        except (IOError, OSError) as error:
+            print("[!] Warning: the API response cache is disabled: {0}".format(error))
+
+    try:
+        max_rate = parseRate(args.max_rate) if args.max_rate else None
+        max_transfer_rate = parseRate(args.max_transfer_rate) if args.max_transfer_rate else None
+    except ValueError as error:
+        print("Error: invalid --max-rate or --max-transfer-rate: {0}".format(error))
+        print("\nExiting...")
+        exit(1)
+
+    git_config = {}
+    if max_rate or max_transfer_rate:
+        proxy = ThrottlingProxy(max_rate, max_transfer_rate)
+        git_config["http.proxy"] = proxy.start()
+        atexit.register(proxy.stop)
+    shaper = TrafficShaper(args.max_per_host)
+
+    if args.snapshot is True and args.mirror is True:
+        print("Error: --snapshot and --mirror cannot be used together.")
+        print("\nExiting...")
+        exit(1)
+
+    if args.api_backend == "graphql" and not credentials:
+        print("Error: --api-backend graphql requires --authentication.")
+        print("\nExiting...")
+        exit(1)
+    rules = exclude_repos.strip().split(",") if exclude_repos is not None else []
+    try:
+        if args.filter_file:
+            repo_filter = RepoFilter.load(args.filter_file, rules)
+        else:
+            repo_filter = RepoFilter(rules)
+    except (IOError, OSError, ValueError) as error:
+        print("Error: invalid repository filter: {0}".format(error))
+        print("\nExiting...")
+        exit(1)
+
+    api_class = getReposURLsGraphQL if args.api_backend == "graphql" else getReposURLs
+    api = api_class(api_prefix,
+                    pool_size=args.http_pool_size,
+                    keep_alive=not args.no_keep_alive,
+                    credentials=credentials,
+                    cache=cache,
+                    retry=RetryPolicy(args.max_attempts if args.http_retries is None
+                                      else args.http_retries + 1),
+                    metrics=metrics,
+                    repo_filter=repo_filter)
+
+    for credential in credentials:
+        if api.checkAuthentication(credential[0], credential[1]) is False:
+            print("Error: authentication failed for {0}.".format(credential[0]))
             print("\nExiting...")
             exit(1)
-        else:
-            username = authentication.split(":")[0]
-            token = authentication.split(":")[1]
+
+    if credentials:
+        username, token = credentials[0]
     else:
         username = None
         token = None
@@ -567,51 +4510,292 @@ def main():
         print("\nExiting...")
         exit(1)
 
-    URLs = []
-    if include_authenticated_repos is True:
-        URLs.extend(getReposURLs(
-            api_prefix, exclude_repos).fromAuthenticatedUser(username, token, args.exclude_forked))
-        if include_gists is True:
-            URLs.extend(getReposURLs(
-                api_prefix, exclude_repos).AuthenticatedGists(username, token))
+    users = users.replace(" ", "").split(",") if users is not None else []
+    organizations = organizations.replace(" ", "").split(",")\
+        if organizations is not None else []
 
-    if users is not None:
-        users = users.replace(" ", "").split(",")
-        for user in users:
-            URLs.extend(getReposURLs(api_prefix, exclude_repos).fromUser(
-                user,
-                username=username,
-                token=token,
-                include_gists=include_gists,
-                exclude_forked=args.exclude_forked))
+    def enumerateRepos():
+        """
+        Yields the repositories of every requested source as API pages arrive.
+        """
+        if include_authenticated_repos is True:
+            for repo in api.iterAuthenticatedUser(username, token, args.exclude_forked):
+                yield repo
+            if include_gists is True:
+                for repo in api.iterAuthenticatedGists(username, token):
+                    yield repo
 
-    if organizations is not None:
-        organizations = organizations.replace(" ", "").split(",")
+        for user in users:
+            for repo in api.iterUser(user,
+                                     username=username,
+                                     token=token,
+                                     include_gists=include_gists,
+                                     exclude_forked=args.exclude_forked):
+                yield repo
 
         for organization in organizations:
             if include_organization_members is False:
-                URLs.extend(getReposURLs(api_prefix, exclude_repos).fromOrg(
-                    organization,
-                    username=username,
-                    token=token,
-                    exclude_forked=args.exclude_forked))
+                repos = api.iterOrg(organization,
+                                    username=username,
+                                    token=token,
+                                    exclude_forked=args.exclude_forked)
+            else:
+                repos = api.iterOrgIncludeUsers(organization,
+                                                username=username,
+                                                token=token,
+                                                include_gists=include_gists,
+                                                exclude_forked=args.exclude_forked,
+                                                threads_limit=args.enum_threads)
+            for repo in repos:
+                yield repo
+
+    def statePaths(shard=None):
+        """
+        Returns the journal, failure report and state index paths of the
+        run, or of one shard of a manifest.
+        """
+        suffix = "" if shard is None else "-shard-{0}-of-{1}".format(*shard)
+        directory = stateDirectory(output_path)
+        return (os.path.join(directory, "journal{0}.jsonl".format(suffix)),
+                os.path.join(directory, "failures{0}.json".format(suffix)),
+                os.path.join(directory, "state{0}.json".format(suffix)))
+
+    journal_path = None
+    failures_path = None
+    index_path = None
+    if output_path is not None:
+        journal_path, failures_path, index_path = statePaths(shard)
+
+    def retryFailures():
+        """
+        Yields the repositories of the failed clones and of the failed
+        API pages of the last run.
+        """
+        for entry in FailureReport.load(failures_path):
+            if entry["kind"] == "clone":
+                yield Repository.fromDict(entry["repo"])
+            elif entry.get("key"):
+                for repo in api.iterate(entry["URL"], entry["key"],
+                                        username=username, token=token,
+                                        exclude_forked=entry.get("exclude_forked", False),
+                                        rotate=entry.get("rotate", True)):
+                    yield repo
             else:
-                URLs.extend(getReposURLs(api_prefix,
-                                         exclude_repos).fromOrgIncludeUsers(
-                    organization,
-                    username=username,
-                    token=token,
-                    include_gists=include_gists,
-                    exclude_forked=args.exclude_forked))
-
-    URLs = list(set(URLs))
+                print("[!] Cannot retry {0}, run the enumeration again.".format(entry["URL"]))
+
+    def enumerated():
+        """
+        Yields the repositories of the users and organizations, or of
+        the shard of them.
+        """
+        # Order-preserving de-duplication keeps the output stable between runs.
+        repos = uniqueItems(enumerateRepos(), key=lambda repo: repo.URL)
+        if shard is not None:
+            repos = (repo for repo in repos if shardOf(repo, shard[1]) == shard[0])
+        return repos
+
+    def unfinishedRepos(journal_path, repos=None):
+        """
+        Returns the repositories a journal does not show as done, and
+        cleans up their interrupted clones.
+        Optional Input:-
+        repos: the repositories of the run, for a journal that may not
+        have queued all of them yet.
+        """
+        entries = Journal.load(journal_path)
+        if repos is None:
+            repos = [repo for repo, state in entries]
+        done = set(repo.URL for repo, state in entries if state == "done")
+        repos = [repo for repo in repos if repo.URL not in done]
+        for repo in repos:
+            fullpath = repoFullPath(repo.URL, output_path, prefix_mode)
+            removePartialClone(fullpath)
+            removePartialClone(fullpath + ".git")
+        return repos
+
+    if args.retry_failed is True and failures_path is not None:
+        repos = uniqueItems(retryFailures(), key=lambda repo: repo.URL)
+    elif args.resume is True and manifest is not None:
+        # The manifest lists the whole shard, however far its journal got.
+        repos = manifest.shard(*(shard or (0, 1)))
+        total = len(repos)
+        repos = unfinishedRepos(journal_path, repos)
+        print("[*] Resuming: {0} of {1} repositories left.".format(len(repos), total))
+    elif args.resume is True and not echo_urls:
+        # Finished repositories are skipped, interrupted clones cleaned up.
+        if Journal.complete(journal_path):
+            repos = unfinishedRepos(journal_path)
+            total = len(Journal.load(journal_path))
+        elif args.users or args.organizations:
+            print("[!] Warning: the interrupted run had not enumerated every repository,"
+                  " enumerating them again.")
+            repos = list(enumerated())
+            total = len(repos)
+            repos = unfinishedRepos(journal_path, repos)
+        else:
+            print("Error: the interrupted run had not enumerated every repository,"
+                  " resume it with the same --user and --org.")
+            print("\nExiting...")
+            exit(1)
+        print("[*] Resuming: {0} of {1} repositories left.".format(len(repos), total))
+        if args.mirror is True:
+            repos = api.resolveSources(repos, username=username, token=token)
+    elif manifest is not None:
+        repos = manifest.shard(*(shard or (0, 1)))
+    else:
+        repos = enumerated()
+        if args.mirror is True and not echo_urls:
+            repos = api.resolveSources(repos, username=username, token=token)
+
+    def cloneAll(repos, journal_path, failures_path, index_path, report, resume=False):
+        """
+        Clones the repositories and writes the summary and failure report.
+        """
+        controller = None
+        if args.adaptive_threads is True:
+            controller = AdaptiveConcurrency(threads_limit,
+                                             minimum=args.min_threads,
+                                             maximum=args.max_threads)
+
+        if args.preflight is True:
+            repos = sorted(repos, key=lambda repo: -(repo.size or 0))
+            expected, free = checkDiskSpace(repos, output_path, prefix_mode,
+                                            mirror=args.mirror)
+            print("[*] {0} repositories, ~{1} MB expected, {2} MB free.".format(
+                len(repos), expected // 1024 ** 2, free // 1024 ** 2))
+            if expected > free:
+                print("Error: Not enough disk space under the output path.")
+                print("\nExiting...")
+                exit(1)
+
+        if args.clone_engine == "git":
+            # Progress output is only parsed to time the git phases.
+            timed = args.metrics_log or args.metrics_textfile
+            engine = GitCLIEngine(fetch_jobs=args.fetch_jobs,
+                                  progress=metrics.progress if timed else None,
+                                  config=git_config)
+        else:
+            engine = GitPythonEngine(config=git_config)
+
+        index = StateIndex(index_path)
+        results = cloneBulkRepos(repos, output_path, threads_limit=threads_limit,
+                                 username=username, token=token, prefix_mode=prefix_mode,
+                                 controller=controller, max_pending=args.max_pending,
+                                 index=index, incremental=args.incremental,
+                                 options=CloneOptions(depth=args.clone_depth,
+                                                      filter=args.clone_filter,
+                                                      single_branch=args.single_branch,
+                                                      no_tags=args.no_tags,
+                                                      mirror=args.mirror,
+                                                      snapshot=api if args.snapshot else None),
+                                 journal=Journal(journal_path, resume=resume),
+                                 retry=RetryPolicy(args.max_attempts),
+                                 engine=engine,
+                                 metrics=metrics,
+                                 shaper=shaper)
+        print("[*] {0} cloned, {1} updated, {2} skipped, {3} failed.".format(
+            sum(1 for result in results if result.status == "cloned"),
+            sum(1 for result in results if result.status == "updated"),
+            sum(1 for result in results if result.status == "skipped"),
+            sum(1 for result in results if result.status == "failed")))
+
+        for result in results:
+            if result.status == "failed":
+                report.add("clone", result.URL, result.error_class, result.error,
+                           attempts=result.attempts, repo=result.repo.toDict())
+        report.save(failures_path)
+        if report.entries:
+            print("[*] {0} failures written to {1}, retry them with --retry-failed.".format(
+                len(report.entries), failures_path))
+
+        if args.maintenance is True:
+            stores = []
+            networks = os.path.join(stateDirectory(output_path), "networks")
+            if os.path.isdir(networks):
+                stores = [os.path.join(networks, name) for name in sorted(os.listdir(networks))]
+            maintained = maintainBulkRepos([result.path for result in results
+                                            if result.status != "failed" and result.path],
+                                           threads_limit=args.maintenance_threads,
+                                           engine=engine,
+                                           pack_threshold=args.pack_threshold,
+                                           stores=stores,
+                                           metrics=metrics)
+            done = [result for result in maintained if result.error is None]
+            print("[*] Maintenance: {0} repositories, {1} -> {2} packs,"
+                  " {3} -> {4} loose objects, {5} -> {6} MB on disk.".format(
+                      len(done),
+                      sum(result.before["packs"] for result in done),
+                      sum(result.after["packs"] for result in done),
+                      sum(result.before["loose"] for result in done),
+                      sum(result.after["loose"] for result in done),
+                      sum(result.before["bytes"] for result in done) // 1024 ** 2,
+                      sum(result.after["bytes"] for result in done) // 1024 ** 2))
+            for result in maintained:
+                if result.error is not None:
+                    print("[!] Maintenance of {0} failed: {1}".format(
+                        result.path, result.error.strip().splitlines()[-1]))
+
+        if args.export_bundles:
+            # index-shard-I-of-N.json for a shard, next to the other shards' indexes.
+            index_name = os.path.basename(index_path).replace("state", "index", 1)
+            exported = exportBundles(results, args.export_bundles, output_path,
+                                     index_name=index_name,
+                                     threads_limit=args.maintenance_threads,
+                                     engine=engine,
+                                     metrics=metrics)
+            print("[*] Bundles: {0} repositories exported, {1} unchanged,"
+                  " {2} MB written to {3}.".format(
+                      sum(1 for _, written, error in exported if written),
+                      sum(1 for _, written, error in exported if not written and error is None),
+                      sum(written for _, written, _ in exported) // 1024 ** 2,
+                      args.export_bundles))
+            for result, _, error in exported:
+                if error is not None:
+                    print("[!] Export of {0} failed: {1}".format(
+                        result.path, error.strip().splitlines()[-1]))
+
     if echo_urls is True:
-        for URL in URLs:
-            print(parseGitURL(URL, username=username, token=token))
-        return
+        for repo in repos:
+            print(parseGitURL(repo.URL, username=username, token=token))
+    elif args.write_manifest:
+        manifest = Manifest(repos)
+        manifest.save(args.write_manifest)
+        print("[*] {0} repositories written to {1}.".format(
+            len(manifest.repos), args.write_manifest))
+    elif manifest is None:
+        cloneAll(repos, journal_path, failures_path, index_path, api.failures,
+                 resume=args.resume)
+    else:
+        lease_directory = args.manifest + ".leases"
+        lease = ShardLease(lease_directory, manifest, shard or (0, 1),
+                           timeout=args.lease_timeout)
+        if not lease.acquire():
+            print("Error: shard {0}/{1} is being cloned by {2}.".format(
+                lease.shard[0], lease.shard[1], lease.holder()))
+            print("\nExiting...")
+            exit(1)
+        cloneAll(repos, journal_path, failures_path, index_path, api.failures,
+                 resume=args.resume)
+        lease.release(done=True)
+
+        if args.takeover is True:
+            count = lease.shard[1]
+            for peer in range(count):
+                lease = ShardLease(lease_directory, manifest, (peer, count),
+                                   timeout=args.lease_timeout)
+                if lease.state() not in ("stale", "abandoned") or not lease.acquire():
+                    continue
+                print("[*] Taking over shard {0}/{1}.".format(peer, count))
+                peer_journal, peer_failures, peer_index = statePaths((peer, count))
+                peer_repos = unfinishedRepos(peer_journal, manifest.shard(peer, count))
+                cloneAll(peer_repos, peer_journal, peer_failures, peer_index,
+                         FailureReport(), resume=True)
+                lease.release(done=True)
 
-    cloneBulkRepos(URLs, output_path, threads_limit=threads_limit,
-                   username=username, token=token, prefix_mode=prefix_mode)
+    if args.http_stats is True:
+        print("[*] HTTP: {0}".format(api.stats))
+        if cache is not None:
+            print("[*] HTTP: {0} pages revalidated from the cache".format(cache.hits))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,301 @@
+# coding=utf-8
+"""
+Unit tests of GithubCloner. The API tests run against the mock server
+of the benchmarks, so no network access is needed.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import githubcloner  # noqa: E402
+from githubcloner import Journal, RepoFilter, Repository, shardOf  # noqa: E402
+from mock_github import Dataset, MockGithub  # noqa: E402
+
+
+def repository(name, **kwargs):
+    """
+    Returns the Repository of an "owner/name".
+    """
+    return Repository("https://github.com/{0}.git".format(name), **kwargs)
+
+
+class RepoFilterTest(unittest.TestCase):
+
+    def assertMatches(self, rules, expected):
+        repo_filter = RepoFilter(rules)
+        for repo, passes in expected:
+            self.assertEqual(repo_filter.match(repo), passes,
+                             "{0!r} on {1!r}".format(rules, repo))
+
+    def test_names(self):
+        self.assertMatches(["tmp"], [
+            (repository("org/tmp"), False),
+            (repository("other/TMP"), False),
+            (repository("org/tmp2"), True),
+            (repository("org/repo"), True)])
+
+    def test_owner_name(self):
+        self.assertMatches(["org/tmp"], [
+            (repository("org/tmp"), False),
+            (repository("other/tmp"), True)])
+
+    def test_globs(self):
+        self.assertMatches(["tmp-*"], [
+            (repository("org/tmp-1"), False),
+            (repository("other/tmp-2"), False),
+            (repository("org/repo-tmp-1"), True)])
+        self.assertMatches(["org/tmp-?"], [
+            (repository("org/tmp-1"), False),
+            (repository("org/tmp-10"), True),
+            (repository("other/tmp-1"), True)])
+
+    def test_regexes(self):
+        self.assertMatches([r"re:^org/tmp-\d+$"], [
+            (repository("org/tmp-12"), False),
+            (repository("org/tmp-x"), True)])
+        self.assertMatches(["re:(?i)foo", "re:bar"], [
+            (repository("org/FOO"), False),
+            (repository("org/bar"), False),
+            (repository("org/baz"), True)])
+        self.assertMatches([r"re:(a)\1", r"re:(b)\1"], [
+            (repository("org/aa"), False),
+            (repository("org/bb"), False),
+            (repository("org/ab"), True)])
+
+    def test_includes(self):
+        self.assertMatches(["+org/*", "org/tmp"], [
+            (repository("org/repo"), True),
+            (repository("org/tmp"), False),
+            (repository("other/repo"), False)])
+        self.assertMatches(["+re:^other/"], [
+            (repository("other/repo"), True),
+            (repository("org/repo"), False)])
+
+    def test_size(self):
+        self.assertMatches(["min-size: 10", "max-size: 100"], [
+            (repository("org/small", size=5), False),
+            (repository("org/medium", size=50), True),
+            (repository("org/large", size=500), False),
+            (repository("org/unknown"), True)])
+
+    def test_languages(self):
+        self.assertMatches(["language: Python, Go"], [
+            (repository("org/a", language="python"), True),
+            (repository("org/b", language="Go"), True),
+            (repository("org/c", language="C"), False),
+            (repository("org/d"), True)])
+        self.assertMatches(["exclude-language: c"], [
+            (repository("org/a", language="C"), False),
+            (repository("org/b", language="Python"), True)])
+
+    def test_archived(self):
+        self.assertMatches(["archived: false"], [
+            (repository("org/a", archived=True), False),
+            (repository("org/b", archived=False), True),
+            (repository("org/c"), True)])
+        self.assertMatches(["archived: any"], [
+            (repository("org/a", archived=True), True)])
+
+    def test_pushed_since(self):
+        self.assertMatches(["pushed-since: 2020-01-01"], [
+            (repository("org/a", pushed_at="2019-12-31T23:59:59Z"), False),
+            (repository("org/b", pushed_at="2020-06-01T00:00:00Z"), True),
+            (repository("org/c", updated_at="2019-01-01T00:00:00Z"), False),
+            (repository("org/d"), True)])
+
+    def test_bare_predicate_names(self):
+        self.assertMatches(["language", "archived"], [
+            (repository("org/language"), False),
+            (repository("org/archived"), False),
+            (repository("org/repo", language="Python", archived=True), True)])
+
+    def test_comments(self):
+        self.assertMatches(["# tmp", "", "  "], [
+            (repository("org/tmp"), True)])
+
+    def test_invalid_rules(self):
+        for rule in ("re:(", "min-size: big", "archived: maybe", "pushed-since: yesterday"):
+            self.assertRaises(ValueError, RepoFilter, [rule])
+
+    def test_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "filter")
+            with open(path, "w") as f:
+                f.write("# exclusions\norg/tmp\n")
+            repo_filter = RepoFilter.load(path, ["other"])
+            self.assertFalse(repo_filter.match(repository("org/tmp")))
+            self.assertFalse(repo_filter.match(repository("other/other")))
+            self.assertTrue(repo_filter.match(repository("org/repo")))
+        finally:
+            shutil.rmtree(directory)
+
+
+class ShardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repos = [repository("org{0}/repo{1}".format(i % 7, i)) for i in range(500)]
+
+    def assignment(self, repos, count):
+        return dict((repo.URL, shardOf(repo, count)) for repo in repos)
+
+    def test_every_shard_is_used(self):
+        shards = self.assignment(self.repos, 8).values()
+        self.assertEqual(set(shards), set(range(8)))
+        for shard in range(8):
+            self.assertGreater(list(shards).count(shard), 500 // 8 // 2)
+
+    def test_stable_when_repositories_change(self):
+        before = self.assignment(self.repos, 8)
+        removed = self.assignment(self.repos[::2], 8)
+        added = self.assignment(self.repos + [repository("new/repo{0}".format(i))
+                                              for i in range(100)], 8)
+        for URL, shard in removed.items():
+            self.assertEqual(shard, before[URL])
+        for URL, shard in before.items():
+            self.assertEqual(added[URL], shard)
+
+    def test_few_moves_when_shards_are_added(self):
+        before = self.assignment(self.repos, 8)
+        after = self.assignment(self.repos, 9)
+        moved = [URL for URL in before if before[URL] != after[URL]]
+        # Only the repositories of the new shard move, about 1/9 of them.
+        self.assertTrue(all(after[URL] == 8 for URL in moved))
+        self.assertLess(len(moved), 500 // 9 * 2)
+
+    def test_case_insensitive(self):
+        self.assertEqual(shardOf(repository("Org/Repo"), 16),
+                         shardOf(repository("org/repo"), 16))
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "journal.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_states(self):
+        result = githubcloner.CloneResult(repository("org/a").URL, status="cloned")
+        journal = Journal(self.path)
+        journal.queued(repository("org/a"))
+        journal.queued(repository("org/b"))
+        journal.started(repository("org/a"))
+        journal.finished(result)
+        journal.close()
+        self.assertEqual([(repo.URL, state) for repo, state in Journal.load(self.path)],
+                         [(repository("org/a").URL, "done"),
+                          (repository("org/b").URL, "queued")])
+        self.assertFalse(Journal.complete(self.path))
+
+    def test_torn_lines(self):
+        journal = Journal(self.path)
+        journal.queued(repository("org/a"))
+        journal.enumerated()
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"state": "queued", "URL": "https://github.com/org/b.git", "re')
+        self.assertEqual([repo.URL for repo, state in Journal.load(self.path)],
+                         [repository("org/a").URL])
+        self.assertTrue(Journal.complete(self.path))
+
+        # Resuming terminates the torn line before appending.
+        journal = Journal(self.path, resume=True)
+        journal.queued(repository("org/c"))
+        journal.close()
+        self.assertEqual([repo.URL for repo, state in Journal.load(self.path)],
+                         [repository("org/a").URL, repository("org/c").URL])
+
+    def test_torn_marker(self):
+        journal = Journal(self.path)
+        journal.queued(repository("org/a"))
+        journal.close()
+        with open(self.path, "a") as f:
+            f.write('{"state": "enum')
+        self.assertFalse(Journal.complete(self.path))
+
+    def test_missing(self):
+        self.assertEqual(Journal.load(self.path), [])
+        self.assertFalse(Journal.complete(self.path))
+
+
+class PaginateTest(unittest.TestCase):
+
+    def setUp(self):
+        dataset = Dataset()
+        dataset.orgs["org"] = ["member"]
+        for i in range(250):
+            dataset.addRepo("org", "repo{0}".format(i), "file:///remotes/org/repo{0}.git".format(i))
+        for i in range(100):
+            dataset.addRepo("single", "repo{0}".format(i), "file:///remotes/single/repo{0}.git".format(i))
+        for i in range(200):
+            dataset.addRepo("member", "own{0}".format(i), "file:///remotes/member/own{0}.git".format(i))
+        self.mock = MockGithub(dataset)
+        self.api_prefix = self.mock.start()
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def api(self, **kwargs):
+        return githubcloner.getReposURLs(self.api_prefix, cache=None, **kwargs)
+
+    def test_every_page(self):
+        api = self.api()
+        pages = list(api.paginate("{0}/orgs/org/repos".format(self.api_prefix)))
+        self.assertEqual([len(page) for page in pages], [100, 100, 50])
+        self.assertEqual(len(set(repo["full_name"] for page in pages for repo in page)), 250)
+        self.assertEqual(self.mock.requests, 3)
+
+    def test_no_trailing_empty_page(self):
+        api = self.api()
+        pages = list(api.paginate("{0}/users/member/repos".format(self.api_prefix)))
+        self.assertEqual([len(page) for page in pages], [100, 100])
+        self.assertEqual(self.mock.requests, 2)
+
+    def test_page_number_fallback(self):
+        # A full page without a Link header may not be the last one.
+        api = self.api()
+        pages = list(api.paginate("{0}/users/single/repos".format(self.api_prefix)))
+        self.assertEqual([len(page) for page in pages], [100, 0])
+        self.assertEqual(self.mock.requests, 2)
+
+    def test_small_pages(self):
+        api = self.api()
+        api.per_page = 30
+        repos = list(api.iterOrg("org"))
+        self.assertEqual(len(repos), 250)
+        self.assertEqual(self.mock.requests, 9)
+
+    def test_one_credential_per_listing(self):
+        api = self.api(credentials=[("alice", "a"), ("bob", "b")])
+        api.per_page = 10
+        credentials = []
+        request = api.request
+
+        def recording(method, API, **kwargs):
+            credentials.append(kwargs.get("auth"))
+            return request(method, API, **kwargs)
+
+        api.request = recording
+        self.assertEqual(len(list(api.iterAuthenticatedUser("alice", "a", False))), 200)
+        self.assertEqual(set(credentials), set([("alice", "a")]))
+        del credentials[:]
+        self.assertEqual(len(list(api.iterOrg("org"))), 250)
+        self.assertEqual(len(set(credentials)), 1)
+
+    def test_filter(self):
+        api = self.api(repo_filter=RepoFilter(["+org/repo1*"]))
+        self.assertEqual(len(list(api.iterOrg("org"))), 1 + 10 + 100)
+
+
+if __name__ == "__main__":
+    unittest.main()